@@ -5,7 +5,7 @@ import coloredlogs
 import pytube
 import tasks
 
-from PyQt6.QtCore import QDateTime, QRect, QThread, QTimer, Qt, pyqtSlot
+from PyQt6.QtCore import QRect, QThread, QTimer, Qt, pyqtSlot
 from PyQt6.QtWidgets import (
     QDialog,
     QHeaderView,
@@ -23,9 +23,17 @@ from ui.help_dialog import Ui_HelpDialog
 from ui.search_menu import Ui_SearchMenu
 from ui.welcome_menu import Ui_WelcomeMenu
 from ui.download_from_url_dialog import Ui_DownloadFromURL
-from my_widget import DownloadButton, PlaybackMode, Playlist, QSliderDirectJumpStyle
+from library import Library
+from my_widget import (
+    DownloadButton,
+    PlaybackMode,
+    PlaybackRefresher,
+    Playlist,
+    QSliderDirectJumpStyle,
+    SeekController,
+)
 from PyQt6 import QtGui
-from app_settings import FORMAT, LOGGING_LEVEL
+from app_settings import FORMAT, LOGGING_LEVEL, SEARCH_SCROLL_THRESHOLD
 from ui.playlist_ui import Ui_PlaylistWidget
 from tasks import Settings
 
@@ -40,6 +48,9 @@ class App(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
 
+        # before the ui, the playlists read from it as they're created
+        Playlist.library = Library()
+
         # initialize variables
         self.ui = Ui_App()
         self.ui.setupUi(self)
@@ -101,16 +112,34 @@ class App(QWidget):
         self.vertical_layout.setSpacing(0)
         self.vertical_layout.setContentsMargins(0, 0, 0, 0)
 
-        self.search_video = tasks.SearchVideo()
-        self.image_loader = tasks.ImageLoader()
+        self.search_coordinator = tasks.SearchCoordinator(self)
+        self.search_coordinator.search_started.connect(self.show_searching)
+        self.search_coordinator.result_ready.connect(self.done_search)
+        self.search_coordinator.page_ready.connect(self.append_search_page)
+        self.search_coordinator.exhausted.connect(self.search_exhausted)
+        self.search_coordinator.image_loaded.connect(self.load_image)
+
+        self.loading_page = False
+        self.has_more_results = False
 
-        self.image_loading_thread = QThread()
-        self.search_thread = QThread()
+        # link -> button of the downloads waiting for their metadata
+        self.pending_downloads: dict[str, QPushButton] = dict()
+        self.metadata_service = tasks.MetadataService(self)
+        self.metadata_service.metadata_ready.connect(self.confirm_download)
+        self.metadata_service.metadata_failed.connect(self.metadata_failed)
 
-        self.image_loading_thread.setTerminationEnabled(True)
-        self.search_thread.setTerminationEnabled(True)
+        self.loudness_analyzer = tasks.LoudnessAnalyzer(self)
+        self.loudness_analyzer.analyzed.connect(self.loudness_analyzed)
+        self.loudness_analyzer.analyze(Playlist.library.unanalyzed_musics())
 
+        # link -> button of the running downloads
+        self.download_buttons: dict[str, QPushButton] = dict()
         App.video_download_manager.done_downloading.connect(self.done_downloading)
+        App.video_download_manager.done_downloading.connect(self.set_button_downloaded)
+        App.video_download_manager.progress_changed.connect(self.set_button_progress)
+        # the downloads only start once the loader pushed every music, a music
+        # pushed in between would shift the rows of the downloads playlist
+        self.playlist_loaded = False
 
         # initialize widgets
         ui_welcome_menu: Ui_WelcomeMenu = self.add_widget(
@@ -137,19 +166,37 @@ class App(QWidget):
         )
         ui_search_menu.results.horizontalHeader().setStretchLastSection(True)
         ui_search_menu.results.verticalScrollBar().setSingleStep(20)
+        ui_search_menu.results.verticalScrollBar().valueChanged.connect(
+            self.results_scrolled
+        )
+        self.search_coordinator.error_occurred.connect(
+            lambda error: (
+                ui_search_menu.searching_label.setText(
+                    f"Error occurred while searching: {error}"
+                )
+            )
+        )
 
         ui_playlist: Ui_PlaylistWidget = self.add_widget(
             Ui_PlaylistWidget(), "playlist"
         )
         # ui_playlist.playlist.set_downloads_playlist_mode()
         ui_playlist.playlist.load_music()
+        ui_playlist.playlist.playlist_loader.done_loading.connect(self.start_downloads)
+        App.video_download_manager.replacing.connect(
+            ui_playlist.playlist.release_music,
+            Qt.ConnectionType.BlockingQueuedConnection,
+        )
+        App.video_download_manager.replaced.connect(ui_playlist.playlist.reload_music)
         ui_playlist.playlist.set_playback_mode(Settings.playback_mode)
+        ui_playlist.filter_bar.textChanged.connect(ui_playlist.playlist.filter_rows)
 
         self.get_widget("welcome_menu", 0).show()
 
         # initialize connections
         self.ui.search_button.clicked.connect(self.start_search)
         self.ui.search_bar.returnPressed.connect(self.start_search)
+        self.ui.search_bar.textEdited.connect(self.search_coordinator.schedule)
         ui_welcome_menu.help_button.clicked.connect(self.help_dialog.exec)
         self.ui.download_from_url_button.clicked.connect(
             self.download_directly_dialog.exec
@@ -212,29 +259,18 @@ class App(QWidget):
         ui_playlist.playlist.has_music.connect(
             lambda: (self.ui.progress_bar.setEnabled(True),)
         )
-        ui_playlist.playlist.media_player.durationChanged.connect(
-            lambda duration: (
-                self.ui.progress_bar.blockSignals(True),
-                self.ui.progress_bar.setMaximum(duration),
-                self.ui.total_duration.setText(
-                    QDateTime.fromMSecsSinceEpoch(duration).toString("m:ss")
-                ),
-                self.ui.progress_bar.blockSignals(False),
-            ),
-        )
-        ui_playlist.playlist.media_player.positionChanged.connect(
-            lambda position: (
-                self.ui.progress_bar.blockSignals(True),
-                self.ui.progress_bar.setSliderPosition(position),
-                self.ui.duration_passed.setText(
-                    QDateTime.fromMSecsSinceEpoch(position).toString("m:ss")
-                ),
-                self.ui.progress_bar.blockSignals(False),
-            )
+        self.playback_refresher = PlaybackRefresher(
+            ui_playlist.playlist.media_player,
+            self.ui.progress_bar,
+            self.ui.duration_passed,
+            self.ui.total_duration,
+            self,
         )
 
-        self.ui.progress_bar.valueChanged.connect(
-            lambda value: (ui_playlist.playlist.media_player.setPosition(value))
+        self.seek_controller = SeekController(
+            ui_playlist.playlist.media_player,
+            self.ui.progress_bar,
+            self.playback_refresher,
         )
 
         self.ui.progress_bar.setPageStep(10 * 1000)
@@ -289,12 +325,13 @@ class App(QWidget):
 
     @staticmethod
     def set_volume(playlist: Playlist, value: int):
-        new_volume = (
-            value / 100 * playlist.get_data("volume_multiplier", default_value=1)
-        )
-        if new_volume > 1.0:
-            new_volume = 1.0
-        playlist.audio_output.setVolume(new_volume)
+        playlist.audio_output.setVolume(playlist.output_volume(value))
+
+    @pyqtSlot(str, float)
+    def loudness_analyzed(self, video_id: str, _: float):
+        playlist: Playlist = self.get_widget("playlist").playlist
+        if playlist.get_data() == video_id:
+            self.set_volume(playlist, self.ui.volume_bar.value())
 
     def add_widget(self, ui, name: str):
         menu = QWidget(self.ui.main_menu)
@@ -333,12 +370,41 @@ class App(QWidget):
         ui_search_menu.results.show()
         ui_search_menu.searching_label.hide()
 
+        self.loading_page = False
+        self.has_more_results = True
+
         ui_search_menu.results.setRowCount(0)
         self.delete_cell_widgets()
 
+        self.append_search_results(search_result)
+
+    @pyqtSlot(dict)
+    def append_search_page(self, search_result: dict):
+        self.loading_page = False
+        self.append_search_results(search_result)
+
+    def search_exhausted(self):
+        self.loading_page = False
+        self.has_more_results = False
+
+    def results_scrolled(self, value: int):
+        scroll_bar = self.get_widget("search_menu").results.verticalScrollBar()
+        if value < scroll_bar.maximum() - SEARCH_SCROLL_THRESHOLD:
+            return
+        if self.loading_page or not self.has_more_results:
+            return
+
+        # the page is usually prefetched already, so it arrives right away
+        self.loading_page = True
+        self.search_coordinator.next_page()
+
+    def append_search_results(self, search_result: dict):
+        ui_search_menu: Ui_SearchMenu = self.get_widget("search_menu")
+        first_row = ui_search_menu.results.rowCount()
+
         start = time.perf_counter()
 
-        for (index, result) in enumerate(search_result["result"]):
+        for index, result in enumerate(search_result["result"], first_row):
             link = result["link"] if "link" in result else None
 
             download_button = DownloadButton(link, self)
@@ -346,6 +412,8 @@ class App(QWidget):
                 partial(self.start_download, download_button)
             )
             download_button.setMinimumWidth(400)
+            if Playlist.is_downloaded(result.get("id")):
+                download_button.mark_downloaded()
 
             ui_search_menu.results.insertRow(index)
             try:
@@ -367,37 +435,21 @@ class App(QWidget):
         end = time.perf_counter()
         logger.debug(f"Time Elapsed: {end-start} seconds")
 
-        self.image_loading_thread = QThread()
-        self.image_loader = tasks.ImageLoader()
-        self.image_loader.moveToThread(self.image_loading_thread)
-        self.image_loader.done.connect(self.image_loading_thread.quit)
-        self.image_loader.image_loaded.connect(
-            lambda index: self.load_image(index, ui_search_menu.results)
-        )
-
-        self.image_loading_thread.started.connect(
-            partial(
-                self.image_loader.load_images,
-                search_result,
-                ui_search_menu.results.size(),
-            )
+        self.search_coordinator.load_images(
+            search_result, ui_search_menu.results.size(), first_row
         )
-        self.image_loading_thread.start()
-
-    @pyqtSlot(int, QTableWidget)
-    def load_image(self, index: int, table_widget: QTableWidget):
-        pixmap: QtGui.QPixmap = self.image_loader.thumbnails[0][0]
-        duration = self.image_loader.thumbnails[0][1]
 
+    def load_image(self, index: int, image: QtGui.QImage, duration: str):
+        table_widget: QTableWidget = self.get_widget("search_menu").results
         thumbnail = QLabel()
-        thumbnail.setPixmap(pixmap)
+        thumbnail.setPixmap(QtGui.QPixmap.fromImage(image))
 
         duration = QLabel(duration, thumbnail)
         duration.setFont(QtGui.QFont("SF Mono", 12))
         duration.setStyleSheet("QLabel { color: white; background-color: black }")
 
         table_widget.setCellWidget(index, 0, thumbnail)
-        table_widget.resizeRowsToContents()
+        table_widget.resizeRowToContents(index)
 
         bottom_left = thumbnail.size()
 
@@ -406,43 +458,11 @@ class App(QWidget):
             200 - duration.height(),
         )
 
-        self.image_loader.thumbnails.pop()
-
     def start_search(self):
         if not self.ui.search_bar.text():
             return
 
-        self.hide_all_widget()
-        self.get_widget("search_menu", 0).show()
-
-        ui_search_menu: Ui_SearchMenu = self.mainmenu_widgets["search_menu"][1]
-        ui_search_menu.searching_label.setText(f"Searching {self.ui.search_bar.text()}")
-        ui_search_menu.searching_label.show()
-        ui_search_menu.results.hide()
-
-        if self.image_loading_thread.isRunning():
-            self.image_loader.interrupt = True
-            self.image_loading_thread.quit()
-        if self.search_thread.isRunning():
-            self.search_thread.quit()
-
-        self.search_thread = QThread()
-        self.search_video = tasks.SearchVideo()
-        self.search_video.moveToThread(self.search_thread)
-        self.search_video.done.connect(self.search_thread.quit)
-        self.search_video.result_ready.connect(self.done_search)
-        self.search_video.error_occurred.connect(
-            lambda error: (
-                ui_search_menu.searching_label.setText(
-                    f"Error occurred while searching: {error}"
-                )
-            )
-        )
-
-        self.search_thread.started.connect(
-            partial(self.search_video.search, self.ui.search_bar.text())
-        )
-        self.search_thread.start()
+        self.search_coordinator.search(self.ui.search_bar.text())
 
         self.ui.search_bar.setDisabled(True)
         self.ui.search_button.setDisabled(True)
@@ -454,24 +474,66 @@ class App(QWidget):
             ),
         )
 
+    @pyqtSlot(str)
+    def show_searching(self, search_text: str):
+        self.hide_all_widget()
+        self.get_widget("search_menu", 0).show()
+
+        ui_search_menu: Ui_SearchMenu = self.mainmenu_widgets["search_menu"][1]
+        ui_search_menu.searching_label.setText(f"Searching {search_text}")
+        ui_search_menu.searching_label.show()
+        ui_search_menu.results.hide()
+
+        self.has_more_results = False
+
     def closeEvent(self, a0: QtGui.QCloseEvent) -> None:
-        self.search_thread.terminate()
-        self.image_loading_thread.terminate()
-        self.image_loader.interrupt = True
+        self.search_coordinator.shutdown()
+        self.loudness_analyzer.shutdown()
 
         playlist = self.get_widget("playlist").playlist
         Settings.save_settings(
             volume=self.ui.volume_bar.value(), playback_mode=playlist.playback_mode
         )
 
-        playlist.save_downloads_playlist()
         playlist.save_current_playlist()
 
         return super().closeEvent(a0)
 
-    def set_button_downloaded(self, button: QPushButton):
+    @pyqtSlot()
+    def start_downloads(self):
+        """
+        continues the downloads restored from the journal, and the ones queued
+        while the playlist was loading
+        """
+        self.playlist_loaded = True
+        App.video_download_manager.download()
+
+    @pyqtSlot(str, Exception, bool)
+    def set_button_downloaded(self, link: str, _: Exception, error_exist: bool):
+        button = self.download_buttons.pop(link, None)
+        if button is None:
+            return
+
         try:
-            button.setText("Downloaded!")
+            if error_exist:
+                # the partial download is kept, so retrying only fetches the rest
+                button.setText("Retry")
+                button.setEnabled(True)
+            else:
+                button.setText("Downloaded!")
+        except Exception:
+            pass
+
+    @pyqtSlot(str, int, float)
+    def set_button_progress(self, link: str, percent: int, bytes_per_second: float):
+        button = self.download_buttons.get(link)
+        if button is None:
+            return
+
+        try:
+            button.setText(
+                f"Downloading... {percent}% ({bytes_per_second / 1024 / 1024:.1f} MB/s)"
+            )
         except Exception:
             pass
 
@@ -486,8 +548,30 @@ class App(QWidget):
 
     @pyqtSlot(DownloadButton)
     def start_download(self, button: DownloadButton):
-        video = pytube.YouTube(button.link)
-        if video.length >= 600:
+        self.request_download(button.link, button)
+
+    @pyqtSlot(str, QPushButton)
+    def download_directly_from_url(self, url: str, button: QPushButton):
+        self.request_download(url, button)
+
+    def request_download(self, link: str, button: QPushButton):
+        # the download starts once the metadata is there, which is right away
+        # for search results
+        try:
+            button.setEnabled(False)
+        except Exception:
+            pass
+
+        self.pending_downloads[link] = button
+        self.metadata_service.request(link)
+
+    @pyqtSlot(str, dict)
+    def confirm_download(self, link: str, metadata: dict):
+        button = self.pending_downloads.pop(link, None)
+        if button is None:
+            return
+
+        if (metadata["length"] or 0) >= 600:
             choice_button = QMessageBox.warning(
                 self,
                 "Warning",
@@ -495,23 +579,23 @@ class App(QWidget):
                 QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel,
             )
             if choice_button == QMessageBox.StandardButton.Cancel:
+                self.enable_button(button)
                 return
 
-        for index, url in enumerate(Playlist.urls):
-            if video.video_id == url:
-                choice = QMessageBox.warning(
-                    self,
-                    "Warning",
-                    "Video is already downloaded. Do you want to replace it?",
-                    QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel,
-                )
-                if choice == QMessageBox.StandardButton.Cancel:
-                    return
-
-                ui: Ui_PlaylistWidget = self.get_widget("playlist")
-                ui.playlist.delete_playlist(index)
+        if Playlist.is_downloaded(metadata["id"]):
+            # the download overwrites the file, the thumbnail and the library
+            # entry in place, so the playlists keep referencing it
+            choice = QMessageBox.warning(
+                self,
+                "Warning",
+                "Video is already downloaded. Do you want to replace it?",
+                QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel,
+            )
+            if choice == QMessageBox.StandardButton.Cancel:
+                self.enable_button(button)
+                return
 
-        logger.debug(f"start download {button.link}")
+        logger.debug(f"start download {link}")
 
         try:
             button.setText("Downloading...")
@@ -519,61 +603,55 @@ class App(QWidget):
         except Exception as error:
             logger.error("cannot edit button! %s", error)
 
-        App.video_download_manager.add_download(button.link)
-        App.video_download_manager.done_downloading.connect(
-            partial(self.set_button_downloaded, button)
+        self.download_buttons[link] = button
+        App.video_download_manager.add_download(link)
+        if self.playlist_loaded:
+            App.video_download_manager.download()
+
+    @pyqtSlot(str, Exception)
+    def metadata_failed(self, link: str, error: Exception):
+        button = self.pending_downloads.pop(link, None)
+        if button is None:
+            return
+
+        self.enable_button(button)
+        QMessageBox.warning(
+            self,
+            "Failed to download!",
+            f'Failed to download from url: "{link}" (Error: {error})',
         )
-        App.video_download_manager.download()
+
+    @staticmethod
+    def enable_button(button: QPushButton):
+        try:
+            button.setEnabled(True)
+        except Exception:
+            pass
 
     @pyqtSlot(str, Exception, bool)
     def done_downloading(self, link: str, error: Exception, error_exist: bool):
-        video = pytube.YouTube(link)
+        try:
+            metadata = tasks.MetadataService.lookup(pytube.extract.video_id(link))
+        except Exception:
+            metadata = None
+        title = link if metadata is None else metadata["title"]
 
         if error_exist:
             QMessageBox.warning(
                 self,
                 "Failed to download!",
-                f"Failed to download {video.title} (Error: {error})",
+                f"Failed to download {title} (Error: {error})",
             )
             return
 
+        if metadata is not None:
+            ui: Ui_PlaylistWidget = self.get_widget("playlist")
+            # a replaced download comes with a new thumbnail
+            ui.playlist.refresh_thumbnail(metadata["id"])
+            self.loudness_analyzer.analyze([metadata["id"]])
+
         QMessageBox.information(
             self,
             "Done Downloading!",
-            f'Video "{video.title}" has been successfully downloaded',
-        )
-
-    @pyqtSlot(str, QPushButton)
-    def download_directly_from_url(self, url: str, button: QPushButton):
-        try:
-            video = pytube.YouTube(url)
-        except Exception as error:
-            QMessageBox.warning(
-                self,
-                "Failed to download!",
-                f'Failed to download from url: "{url}" (Error: {error})',
-            )
-            return
-
-        if video.length >= 600:
-            choice_button = QMessageBox.warning(
-                self,
-                "Warning",
-                "You are about to download a video that is more than 10 minutes long. It might take a long time. Continue?",
-                QMessageBox.StandardButton.Ok | QMessageBox.StandardButton.Cancel,
-            )
-            if choice_button == QMessageBox.StandardButton.Cancel:
-                return
-        logger.debug(f"start download {url}")
-
-        try:
-            button.setText("Downloading...")
-            button.setEnabled(False)
-        except Exception:
-            pass
-
-        App.video_download_manager.add_download(url)
-        App.video_download_manager.done_downloading.connect(
-            partial(self.set_button_downloaded, button)
+            f'Video "{title}" has been successfully downloaded',
         )
-        App.video_download_manager.download()
@@ -2,24 +2,83 @@ import logging
 
 from PyQt6.QtGui import QColor
 
-
 SEARCH_LIMIT = 15
+# how close to the bottom of the results, in pixels, the next page is loaded
+SEARCH_SCROLL_THRESHOLD = 400
+SEARCH_DEBOUNCE_MS = 400
+SEARCH_WORKERS = 2
+# how often a search waiting on the network checks if it was superseded, in seconds
+SEARCH_POLL_INTERVAL = 0.1
+THUMBNAIL_WORKERS = 8
+THUMBNAIL_TIMEOUT = 10
+SEARCH_CACHE_FILE = "search_cache.json"
+SEARCH_CACHE_SIZE = 64
+SEARCH_CACHE_TTL = 60 * 60
+# words of a library search this long also match words with a similar spelling
+LOCAL_SEARCH_FUZZY_LENGTH = 4
+LOCAL_SEARCH_SIMILARITY = 0.5
 
 LOGGING_LEVEL = logging.DEBUG
 FORMAT = "[%(filename)s(%(lineno)s): %(levelname)s] %(funcName)s(): %(message)s"
 
+METADATA_WORKERS = 4
+
+# one analyzer process per core
+LOUDNESS_WORKERS = None
+LOUDNESS_TARGET = -18.0
+LOUDNESS_MAX_TRUE_PEAK = -1.0
+LOUDNESS_MAX_GAIN = 12.0
+
 DOWNLOAD_AUDIO_TO = "downloads"
 DOWNLOADS_PLAYLIST = DOWNLOAD_AUDIO_TO
+DOWNLOAD_WORKERS = 4
+# downloads at once from the host serving the streams, fewer than the workers
+DOWNLOADS_PER_HOST = 2
+DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+DOWNLOAD_TIMEOUT = 30
+DOWNLOAD_PROGRESS_INTERVAL = 0.25
+DOWNLOAD_MAX_ATTEMPTS = 3
+DOWNLOAD_JOURNAL_FILE = "download_queue.json"
+DOWNLOAD_JOURNAL_INTERVAL = 5
 
 PLAYLIST_DIRECTORY = "./playlists/"
 DOWNLOADS_DIRECTORY = "./downloads/"
 
 YOUTUBE_PREFIX = "https://www.youtube.com/watch?v="
 
+# "live" goes to the network, "record" goes to the network and stores every
+# answer in NETWORK_FIXTURE_FOLDER, "replay" only answers from what was stored
+NETWORK_MODE = "live"
+NETWORK_FIXTURE_FOLDER = "fixtures/"
+# the delay before every replayed answer, in seconds
+REPLAY_LATENCY = 0.0
+# how fast replayed bodies are read, in bytes per second, 0 for no limit
+REPLAY_BANDWIDTH = 0
+# replays over a local http server instead of in the app itself
+REPLAY_SERVER = False
+
 THUMBNAIL_FOLDER = "thumbnails/"
+THUMBNAIL_HEIGHT_TO_WIDTH_RATIO = 3 / 4
+THUMBNAIL_WIDTH_BUCKET = 16
+THUMBNAIL_CACHE_FOLDER = THUMBNAIL_FOLDER + "cache/"
+THUMBNAIL_CACHE_SIZE = 64 * 1024 * 1024
+THUMBNAIL_CACHE_MAX_AGE = 24 * 60 * 60
+DECODED_THUMBNAIL_CACHE_SIZE = 128
+SCALED_THUMBNAIL_CACHE_SIZE = 512
+RESIZE_DEBOUNCE_MS = 150
+# how often the progress bar and the clocks follow the music while it plays
+PLAYBACK_REFRESH_MS = 250
+# the longest a seek is waited for before the next one is sent anyway
+SEEK_TIMEOUT_MS = 250
+# how close a reported position has to be to a seek to count as its answer
+SEEK_TOLERANCE_MS = 500
 SETTINGS_FILE = "settings.json"
+LIBRARY_FILE = "library.db"
 
 CURRENT_PLAYING_SONG_COLOR = QColor(0, 150, 0)
+# a fixed seed makes the random playback mode repeat the same order
+SHUFFLE_SEED = None
 
 IMAGE_RESOURCES = ["resources/images/"] * 9
 IMAGE_RESOURCES[0] += "backward.png"
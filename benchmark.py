@@ -0,0 +1,360 @@
+"""
+headless benchmark of the playlist on synthetic libraries
+
+    python benchmark.py
+    python benchmark.py --sizes 1000,10000 --output results.json
+
+every size gets its own library.db and thumbnails/ filled with random
+musics and thumbnails, the timings are written as json and compared against
+benchmark_baseline.json, the exit code is 1 if anything got slower than the
+tolerance
+
+the baseline holds the timings of one machine, after a change that is meant
+to be slower, or on another machine, write a new one with
+--output benchmark_baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+# before anything of Qt is imported, the benchmark never opens a window
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import coloredlogs
+
+from typing import Callable, Optional
+from PyQt6.QtCore import QBuffer, QIODevice, QRect, QT_VERSION_STR
+from PyQt6.QtGui import QColor, QImage, QPainter
+from PyQt6.QtWidgets import QApplication, QWidget
+from app_settings import FORMAT, LIBRARY_FILE, LOGGING_LEVEL, THUMBNAIL_FOLDER
+from library import Library
+from search_index import SearchIndex
+
+# tasks, my_widget and the ui import it are only imported once the working
+# directory is a generated library, importing tasks sets up the caches of
+# the app in the working directory
+
+coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
+logger = logging.getLogger(__name__)
+
+BENCHMARK_PLAYLIST = "benchmark"
+BASELINE_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json"
+)
+# the random thumbnails, every music gets a copy of one of them
+THUMBNAIL_VARIANTS = 64
+THUMBNAIL_SIZE = (320, 180)
+# the window sizes the resize benchmark switches between
+WINDOW_SIZES = ((800, 600), (1280, 960))
+# changes smaller than this are noise, whatever the ratio
+NOISE_FLOOR_MS = 1.0
+
+WORDS = (
+    "love night heart dream fire summer rain blue light dance home road "
+    "world time never forever alone together golden wild river city star "
+    "moon ocean shadow echo lost young free run falling higher broken"
+).split()
+
+
+def random_thumbnail(generator: random.Random) -> bytes:
+    """
+    a jpeg of random colored blocks, roughly as large as a real thumbnail
+    """
+    width, height = THUMBNAIL_SIZE
+    image = QImage(width, height, QImage.Format.Format_RGB32)
+    painter = QPainter(image)
+    block = 20
+    for x in range(0, width, block):
+        for y in range(0, height, block):
+            painter.fillRect(
+                QRect(x, y, block, block), QColor(generator.randrange(0xFFFFFF))
+            )
+    painter.end()
+
+    buffer = QBuffer()
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, "JPG")
+    return bytes(buffer.data())
+
+
+def random_music(generator: random.Random, index: int, authors: list[str]) -> dict:
+    return {
+        "id": f"{index:011d}",
+        "title": " ".join(generator.sample(WORDS, generator.randint(2, 5))).title(),
+        "author": generator.choice(authors),
+    }
+
+
+def generate_library(size: int, seed: int):
+    """
+    writes library.db and thumbnails/ for size musics into the working
+    directory, with every other music in BENCHMARK_PLAYLIST
+    """
+    generator = random.Random(seed)
+    os.makedirs(THUMBNAIL_FOLDER, exist_ok=True)
+
+    authors = [
+        f"{generator.choice(WORDS).title()} {generator.choice(WORDS).title()} {index}"
+        for index in range(max(size // 10, 1))
+    ]
+    musics = [random_music(generator, index, authors) for index in range(size)]
+    thumbnails = [random_thumbnail(generator) for _ in range(THUMBNAIL_VARIANTS)]
+
+    for music in musics:
+        with open(THUMBNAIL_FOLDER + music["id"], "wb") as file:
+            file.write(generator.choice(thumbnails))
+
+    library = Library()
+    library.add_musics(musics)
+    library.save_playlist(BENCHMARK_PLAYLIST, musics[::2])
+    library.connection.close()
+
+
+def measure(
+    action: Callable[[], None], repeat: int, setup: Callable[[], None] = None
+) -> dict:
+    """
+    runs action repeat times, setup before every run but outside the timing
+    """
+    timings = list()
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        action()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return {"median": statistics.median(timings), "min": min(timings)}
+
+
+class PlaylistBenchmark:
+    """
+    a Playlist inside a bare widget, with Playlist.library pointing at a
+    generated library in the working directory
+    """
+
+    def __init__(self, application: QApplication, repeat: int, seed: int) -> None:
+        # my_widget can only be imported through tasks
+        import tasks
+        from my_widget import Playlist
+        from ui.playlist_ui import Ui_PlaylistWidget
+
+        self.application = application
+        self.repeat = repeat
+        self.random = random.Random(seed)
+
+        Playlist.library = Library()
+        Playlist.musics.clear()
+        Playlist.images.clear()
+        Playlist.id_index.clear()
+        Playlist.search_index = SearchIndex()
+
+        self.widget = QWidget()
+        self.ui = Ui_PlaylistWidget()
+        self.ui.setupUi(self.widget)
+        self.playlist = self.ui.playlist
+        self.widget.resize(*WINDOW_SIZES[0])
+        self.widget.show()
+        self.application.processEvents()
+
+        self.window_size = 0
+
+    def close(self):
+        from my_widget import Playlist
+
+        self.widget.close()
+        self.widget.deleteLater()
+        self.application.processEvents()
+        Playlist.library.connection.close()
+
+    def run(self) -> dict:
+        results = dict()
+        results["load"] = measure(self.load, self.repeat, self.unload)
+        results["set_downloads_playlist_mode"] = measure(
+            self.playlist.set_downloads_playlist_mode, self.repeat
+        )
+        results["load_from_playlist"] = measure(
+            lambda: self.playlist.load_from_playlist(BENCHMARK_PLAYLIST), self.repeat
+        )
+
+        self.playlist.set_downloads_playlist_mode()
+        results["resize"] = measure(self.resize, self.repeat)
+        results["filter"] = measure(self.filter, self.repeat, self.clear_filter)
+        results["clear_filter"] = measure(self.clear_filter, self.repeat, self.filter)
+        results["drop"] = measure(self.drop, self.repeat)
+        return results
+
+    def unload(self):
+        from my_widget import Playlist
+
+        Playlist.musics.clear()
+        Playlist.images.clear()
+        Playlist.id_index.clear()
+        Playlist.search_index = SearchIndex()
+        self.playlist.set_downloads_playlist_mode()
+
+    def load(self):
+        import tasks
+
+        # on the main thread, so item_loaded reaches push_item right away
+        loader = tasks.PlaylistLoader(self.playlist)
+        loader.item_loaded.connect(self.playlist.push_item)
+        loader.load()
+
+    def resize(self):
+        self.window_size = (self.window_size + 1) % len(WINDOW_SIZES)
+        self.widget.resize(*WINDOW_SIZES[self.window_size])
+        self.application.processEvents()
+        # what the debounce timer would run once the user stops resizing
+        self.playlist.resize_timer.stop()
+        self.playlist.rescale_thumbnails()
+        self.playlist.viewport().repaint()
+
+    # painting the rows a filter shows costs what painting after a resize
+    # does, so the filter is timed up to the new layout of the view
+
+    def filter(self):
+        # the titles are made of these words, so a good part of the rows match
+        self.playlist.filter_rows(self.random.choice(WORDS))
+        self.playlist.executeDelayedItemsLayout()
+
+    def clear_filter(self):
+        self.playlist.filter_rows("")
+        self.playlist.executeDelayedItemsLayout()
+
+    def drop(self):
+        """
+        a drag of a few scattered rows, dropEvent needs a real drag to run, so
+        this goes through drop_rows, which is everything dropEvent does after
+        finding the rows
+        """
+        count = self.playlist.rowCount()
+        rows = sorted(self.random.sample(range(count), min(10, count)))
+        self.playlist.drop_rows(rows, self.random.randrange(count + 1))
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    prints every timing next to its baseline, returns the ones that regressed
+    """
+    regressions = list()
+    print(
+        f"{'size':>8} {'benchmark':<28} {'median':>10} {'baseline':>10} {'change':>8}"
+    )
+    for size, timings in results.items():
+        for name, timing in timings.items():
+            reference = baseline.get(size, {}).get(name)
+            if reference is None:
+                print(f"{size:>8} {name:<28} {timing['median']:>8.1f}ms")
+                continue
+
+            change = timing["median"] / max(reference["median"], 1e-9) - 1
+            regressed = (
+                change > tolerance
+                and timing["median"] - reference["median"] > NOISE_FLOOR_MS
+            )
+            print(
+                f"{size:>8} {name:<28} {timing['median']:>8.1f}ms"
+                f" {reference['median']:>8.1f}ms {change:>+7.0%}"
+                + (" REGRESSION" if regressed else "")
+            )
+            if regressed:
+                regressions.append(f"{name} ({size} musics)")
+    return regressions
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        default="1000,10000,100000",
+        help="comma separated library sizes, 100000 takes a few minutes",
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="the json file the results are written to")
+    parser.add_argument(
+        "--baseline",
+        default=BASELINE_FILE,
+        help="a json file of earlier results, nothing is compared if it's empty",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="how much slower than the baseline a median may get, 0.25 is 25%%",
+    )
+    parser.add_argument(
+        "--directory",
+        help="keeps the generated libraries there and reuses them on the next run",
+    )
+    arguments = parser.parse_args(argv)
+
+    sizes = [int(size) for size in arguments.sizes.split(",")]
+    output = arguments.output and os.path.abspath(arguments.output)
+    baseline = dict()
+    if arguments.baseline and os.path.exists(arguments.baseline):
+        with open(arguments.baseline) as file:
+            baseline = json.loads(file.read())["results"]
+    elif arguments.baseline:
+        logger.warning("No baseline at %s, nothing is compared", arguments.baseline)
+
+    root = arguments.directory or tempfile.mkdtemp(prefix="music_player_benchmark_")
+    root = os.path.abspath(root)
+    working_directory = os.getcwd()
+
+    # the debug logs of the playlists would be timed along with them
+    logging.disable(logging.INFO)
+    application = QApplication.instance() or QApplication(sys.argv)
+
+    results = dict()
+    try:
+        for size in sizes:
+            # the library and the thumbnails are opened relative to it
+            folder = os.path.join(root, str(size))
+            os.makedirs(folder, exist_ok=True)
+            os.chdir(folder)
+
+            if not os.path.exists(LIBRARY_FILE):
+                logger.warning("Generating a library of %d musics", size)
+                generate_library(size, arguments.seed)
+
+            benchmark = PlaylistBenchmark(application, arguments.repeat, arguments.seed)
+            try:
+                results[str(size)] = benchmark.run()
+            finally:
+                benchmark.close()
+                os.chdir(working_directory)
+    finally:
+        if not arguments.directory:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "python": platform.python_version(),
+        "qt": QT_VERSION_STR,
+        "platform": platform.platform(),
+        "repeat": arguments.repeat,
+        "results": results,
+    }
+    if output:
+        with open(output, "w") as file:
+            file.write(json.dumps(report, indent=4))
+
+    regressions = compare(results, baseline, arguments.tolerance)
+    if regressions:
+        print(f"Slower than the baseline: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
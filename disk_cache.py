@@ -0,0 +1,361 @@
+import logging
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request as urlreq
+import coloredlogs
+import network
+
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional
+from PyQt6.QtCore import QMutex, Qt
+from PyQt6.QtGui import QImage
+from app_settings import (
+    FORMAT,
+    LOGGING_LEVEL,
+    SEARCH_CACHE_FILE,
+    SEARCH_CACHE_SIZE,
+    SEARCH_CACHE_TTL,
+    THUMBNAIL_CACHE_FOLDER,
+    THUMBNAIL_CACHE_MAX_AGE,
+    THUMBNAIL_CACHE_SIZE,
+    THUMBNAIL_TIMEOUT,
+)
+
+coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
+logger = logging.getLogger(__name__)
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+
+class ThumbnailDiskCache:
+    """
+    http cache of the search thumbnails, stored under THUMBNAIL_CACHE_FOLDER
+
+    every url is stored as <hash>.img with the response headers in <hash>.json,
+    the scaled variants sit next to them as <hash>-<width>.png
+
+    the least recently used urls are evicted once the folder grows past
+    max_size, the access time is kept in the mtime of the .img file so the
+    order survives restarts
+    """
+
+    def __init__(
+        self,
+        folder: str = THUMBNAIL_CACHE_FOLDER,
+        max_size: int = THUMBNAIL_CACHE_SIZE,
+        max_age: int = THUMBNAIL_CACHE_MAX_AGE,
+    ) -> None:
+        self.folder = folder
+        self.max_size = max_size
+        self.max_age = max_age
+        self.mutex = QMutex()
+
+        # url hash -> bytes on disk, least recently used first
+        self.entries: OrderedDict[str, int] = OrderedDict()
+        # url hash -> suffixes of its files, so removing it needs no folder scan
+        self.suffixes: dict[str, set[str]] = dict()
+        self.total_size = 0
+
+        os.makedirs(folder, exist_ok=True)
+        self.scan()
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode()).hexdigest()
+
+    def path(self, key: str, suffix: str) -> str:
+        return os.path.join(self.folder, key + suffix)
+
+    def scan(self):
+        sizes: dict[str, int] = dict()
+        accessed: dict[str, float] = dict()
+        for entry in os.scandir(self.folder):
+            key = entry.name.split(".")[0].split("-")[0]
+            if entry.name.endswith(".tmp"):
+                os.remove(entry.path)
+                continue
+
+            stat = entry.stat()
+            sizes[key] = sizes.get(key, 0) + stat.st_size
+            self.suffixes.setdefault(key, set()).add(entry.name[len(key) :])
+            if entry.name.endswith(".img"):
+                accessed[key] = stat.st_mtime
+
+        for key in sorted(sizes, key=lambda key: accessed.get(key, 0)):
+            self.entries[key] = sizes[key]
+        self.total_size = sum(sizes.values())
+
+    def get(self, url: str, width: int) -> QImage:
+        """
+        returns the thumbnail at url scaled to width, goes to the network only
+        when the stored copy is missing or stale
+        """
+        key = self.key(url)
+        meta = self.read_meta(key)
+
+        data = None
+        if meta is None or time.time() >= meta["expires"]:
+            data = self.fetch(url, key, meta)
+        # still the stored copy, either fresh or revalidated
+        if data is None and os.path.exists(self.path(key, f"-{width}.png")):
+            image = QImage(self.path(key, f"-{width}.png"))
+            if not image.isNull():
+                self.touch(key)
+                return image
+
+        if data is None:
+            with open(self.path(key, ".img"), "rb") as file:
+                data = file.read()
+
+        image = QImage()
+        if not image.loadFromData(data):
+            raise ValueError(f"Cannot decode the thumbnail at {url}")
+
+        image = image.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation)
+        self.write(key, f"-{width}.png", image=image)
+        self.touch(key)
+        return image
+
+    def prefetch(self, url: str):
+        """
+        makes sure a fresh copy of url is on disk, without scaling it
+        """
+        key = self.key(url)
+        meta = self.read_meta(key)
+        if meta is None or time.time() >= meta["expires"]:
+            self.fetch(url, key, meta)
+            self.touch(key)
+
+    def fetch(self, url: str, key: str, meta: Optional[dict]) -> Optional[bytes]:
+        """
+        downloads url, or revalidates the stored copy if there is one
+
+        returns the new body, or None if the stored copy is still good
+        """
+        request = urlreq.Request(url)
+        if meta is not None:
+            if meta.get("etag"):
+                request.add_header("If-None-Match", meta["etag"])
+            if meta.get("last_modified"):
+                request.add_header("If-Modified-Since", meta["last_modified"])
+
+        try:
+            with network.provider.urlopen(
+                request, timeout=THUMBNAIL_TIMEOUT
+            ) as response:
+                data = response.read()
+                headers = response.headers
+        except urllib.error.HTTPError as error:
+            if error.code != 304 or meta is None:
+                raise
+            meta["expires"] = self.expires(error.headers)
+            self.write_meta(key, meta)
+            return None
+        except Exception as error:
+            if meta is None:
+                raise
+            logger.warning("Using the stale thumbnail of %s (Error: %s)", url, error)
+            return None
+
+        if meta is not None:
+            # the old variants were scaled from the old image
+            self.remove(key)
+        self.write(key, ".img", data=data)
+        self.write_meta(
+            key,
+            {
+                "url": url,
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "expires": self.expires(headers),
+            },
+        )
+        return data
+
+    def expires(self, headers) -> float:
+        """
+        when the stored copy has to be revalidated, as the server says, self.max_age
+        is only used when it says nothing
+        """
+        cache_control = (headers.get("Cache-Control") or "").lower()
+        if "no-cache" in cache_control or "no-store" in cache_control:
+            return time.time()
+
+        match = MAX_AGE_PATTERN.search(cache_control)
+        if match:
+            return time.time() + int(match.group(1))
+
+        if headers.get("Expires"):
+            try:
+                return parsedate_to_datetime(headers["Expires"]).timestamp()
+            except (TypeError, ValueError):
+                # an invalid date means already expired
+                return time.time()
+
+        return time.time() + self.max_age
+
+    def read_meta(self, key: str) -> Optional[dict]:
+        if not os.path.exists(self.path(key, ".img")):
+            return None
+        try:
+            with open(self.path(key, ".json")) as file:
+                return json.loads(file.read())
+        except Exception:
+            return None
+
+    def write_meta(self, key: str, meta: dict):
+        self.write(key, ".json", data=json.dumps(meta).encode())
+
+    def write(
+        self,
+        key: str,
+        suffix: str,
+        data: Optional[bytes] = None,
+        image: Optional[QImage] = None,
+    ):
+        path = self.path(key, suffix)
+        # the same url can be fetched by two threads at once
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+
+        old_size = os.path.getsize(path) if os.path.exists(path) else 0
+        if image is not None:
+            if not image.save(temporary_path, "PNG"):
+                return
+        else:
+            with open(temporary_path, "wb") as file:
+                file.write(data)
+        size = os.path.getsize(temporary_path)
+        os.replace(temporary_path, path)
+
+        self.mutex.lock()
+        self.entries[key] = self.entries.get(key, 0) + size - old_size
+        self.entries.move_to_end(key)
+        self.suffixes.setdefault(key, set()).add(suffix)
+        self.total_size += size - old_size
+        self.mutex.unlock()
+
+        self.evict()
+
+    def touch(self, key: str):
+        try:
+            os.utime(self.path(key, ".img"))
+        except OSError:
+            pass
+
+        self.mutex.lock()
+        if key in self.entries:
+            self.entries.move_to_end(key)
+        self.mutex.unlock()
+
+    def remove(self, key: str):
+        self.mutex.lock()
+        self.total_size -= self.entries.pop(key, 0)
+        suffixes = self.suffixes.pop(key, set())
+        self.mutex.unlock()
+
+        for suffix in suffixes:
+            try:
+                os.remove(self.path(key, suffix))
+            except OSError:
+                pass
+
+    def evict(self):
+        while True:
+            self.mutex.lock()
+            # the most recent entry is the one being written right now
+            if self.total_size <= self.max_size or len(self.entries) <= 1:
+                self.mutex.unlock()
+                return
+            key = next(iter(self.entries))
+            self.mutex.unlock()
+
+            logger.debug("Evicting thumbnail %s", key)
+            self.remove(key)
+
+
+class SearchResultCache:
+    """
+    search results keyed by the normalized query and the limit, kept in memory
+    and mirrored to SEARCH_CACHE_FILE
+
+    entries older than ttl are still returned, marked as stale, so they can
+    be shown while a fresh search runs
+    """
+
+    def __init__(
+        self,
+        path: str = SEARCH_CACHE_FILE,
+        max_entries: int = SEARCH_CACHE_SIZE,
+        ttl: int = SEARCH_CACHE_TTL,
+    ) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mutex = QMutex()
+
+        # key -> {"time": fetched at, "result": search result}, least recently used first
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.read()
+
+    @staticmethod
+    def key(query: str, limit: int) -> str:
+        return f"{limit}:{' '.join(query.casefold().split())}"
+
+    def read(self):
+        if not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path) as file:
+                entries: list[list] = json.loads(file.read())
+        except Exception as error:
+            logger.error("Failed to read the search cache! (Error: %s)", error)
+            return
+
+        for key, entry in entries[-self.max_entries :]:
+            self.entries[key] = entry
+
+    def save(self):
+        """
+        the mutex must be held by the caller
+        """
+        temporary_path = self.path + ".tmp"
+        try:
+            with open(temporary_path, "w") as file:
+                file.write(json.dumps(list(self.entries.items())))
+            os.replace(temporary_path, self.path)
+        except Exception as error:
+            logger.error("Failed to save the search cache! (Error: %s)", error)
+
+    def get(self, query: str, limit: int) -> tuple[Optional[dict], bool]:
+        """
+        returns the cached result and whether it is stale
+        """
+        key = self.key(query, limit)
+
+        self.mutex.lock()
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        self.mutex.unlock()
+
+        if entry is None:
+            return None, True
+        return entry["result"], time.time() - entry["time"] >= self.ttl
+
+    def put(self, query: str, limit: int, result: dict):
+        key = self.key(query, limit)
+
+        self.mutex.lock()
+        self.entries[key] = {"time": time.time(), "result": result}
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        self.save()
+        self.mutex.unlock()
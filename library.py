@@ -0,0 +1,406 @@
+import logging
+import json
+import os
+import sqlite3
+import coloredlogs
+
+from contextlib import contextmanager
+from typing import Iterator, Optional
+from PyQt6.QtCore import QMutex
+from app_settings import FORMAT, LIBRARY_FILE, LOGGING_LEVEL, PLAYLIST_DIRECTORY
+
+coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
+logger = logging.getLogger(__name__)
+
+MusicType = dict[str, str | float]
+
+SCHEMA_VERSION = 3
+
+SCHEMA_V1 = """
+CREATE TABLE IF NOT EXISTS musics (
+    id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    title TEXT NOT NULL DEFAULT '',
+    author TEXT NOT NULL DEFAULT '',
+    volume_multiplier REAL NOT NULL DEFAULT 1.0
+);
+CREATE INDEX IF NOT EXISTS musics_position ON musics (position);
+CREATE INDEX IF NOT EXISTS musics_title ON musics (title COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS musics_author ON musics (author COLLATE NOCASE);
+
+CREATE TABLE IF NOT EXISTS playlists (
+    name TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS playlist_musics (
+    playlist TEXT NOT NULL
+        REFERENCES playlists (name) ON DELETE CASCADE ON UPDATE CASCADE,
+    position INTEGER NOT NULL,
+    music_index INTEGER NOT NULL,
+    title TEXT,
+    author TEXT,
+    PRIMARY KEY (playlist, position)
+);
+"""
+
+# playlist entries reference the musics by their video id instead of their index
+SCHEMA_V2 = """
+CREATE TABLE IF NOT EXISTS playlist_musics_v2 (
+    playlist TEXT NOT NULL
+        REFERENCES playlists (name) ON DELETE CASCADE ON UPDATE CASCADE,
+    position INTEGER NOT NULL,
+    music_id TEXT NOT NULL
+        REFERENCES musics (id) ON DELETE CASCADE,
+    title TEXT,
+    author TEXT,
+    PRIMARY KEY (playlist, position)
+);
+CREATE INDEX IF NOT EXISTS playlist_musics_music_id ON playlist_musics_v2 (music_id);
+"""
+
+# the measured loudness of every music, gain is NULL until it was analyzed
+SCHEMA_V3 = """
+ALTER TABLE musics ADD COLUMN loudness REAL;
+ALTER TABLE musics ADD COLUMN true_peak REAL;
+ALTER TABLE musics ADD COLUMN gain REAL;
+"""
+
+MUSIC_COLUMNS = ("id", "title", "author", "volume_multiplier", "gain")
+
+
+class Library:
+    """
+    sqlite storage of the downloaded musics and the playlists
+
+    every change is committed in its own transaction, so nothing is lost if the
+    app is closed in an unusual way
+    """
+
+    def __init__(self, path: str = LIBRARY_FILE) -> None:
+        self.path = path
+        self.mutex = QMutex()
+
+        # the connection is shared with the download and loading threads,
+        # every access goes through self.mutex
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.execute("PRAGMA journal_mode = WAL")
+
+        self.upgrade()
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        self.mutex.lock()
+        try:
+            with self.connection:
+                yield self.connection
+        finally:
+            self.mutex.unlock()
+
+    def upgrade(self):
+        with self.transaction() as connection:
+            version = connection.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+
+            if version < 1:
+                connection.executescript(SCHEMA_V1)
+                self.migrate_json_files(connection)
+            if version < 2:
+                self.migrate_playlist_indices(connection)
+            if version < 3:
+                connection.executescript(SCHEMA_V3)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @staticmethod
+    def migrate_json_files(connection: sqlite3.Connection):
+        """
+        imports downloads.json and the playlist json files of older versions,
+        the files themselves are left untouched
+        """
+        if not os.path.isdir(PLAYLIST_DIRECTORY):
+            return
+
+        for filename in sorted(os.listdir(PLAYLIST_DIRECTORY)):
+            if not filename.endswith(".json"):
+                continue
+
+            try:
+                with open(PLAYLIST_DIRECTORY + filename) as file:
+                    musics: list[dict] = json.loads(file.read())["musics"]
+            except Exception as error:
+                logger.error("Failed to migrate %s! (Error: %s)", filename, error)
+                continue
+
+            if filename == "downloads.json":
+                connection.executemany(
+                    """
+                    INSERT OR IGNORE INTO musics
+                        (id, position, title, author, volume_multiplier)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (
+                        (
+                            music.get("id", ""),
+                            position,
+                            music.get("title", ""),
+                            music.get("author", ""),
+                            music.get("volume_multiplier", 1.0),
+                        )
+                        for position, music in enumerate(musics)
+                    ),
+                )
+                continue
+
+            playlist_name = filename[: -len(".json")]
+            connection.execute(
+                "INSERT OR IGNORE INTO playlists (name) VALUES (?)", (playlist_name,)
+            )
+            connection.executemany(
+                """
+                INSERT INTO playlist_musics
+                    (playlist, position, music_index, title, author)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        playlist_name,
+                        position,
+                        music["index"],
+                        music.get("title"),
+                        music.get("author"),
+                    )
+                    for position, music in enumerate(musics)
+                    if "index" in music
+                ),
+            )
+
+        logger.info("Migrated the json playlists into %s", LIBRARY_FILE)
+
+    @staticmethod
+    def migrate_playlist_indices(connection: sqlite3.Connection):
+        """
+        resolves the positional indices of the playlist entries into video ids,
+        entries whose index points past the end of the library are dropped
+        """
+        connection.executescript(SCHEMA_V2)
+        connection.execute("DELETE FROM playlist_musics_v2")
+        connection.execute("""
+            INSERT INTO playlist_musics_v2
+                (playlist, position, music_id, title, author)
+            SELECT playlist_musics.playlist, playlist_musics.position,
+                indexed_musics.id, playlist_musics.title, playlist_musics.author
+            FROM playlist_musics
+            JOIN (
+                SELECT id, ROW_NUMBER() OVER (ORDER BY position) - 1 AS music_index
+                FROM musics
+            ) AS indexed_musics USING (music_index)
+            """)
+        connection.execute("DROP TABLE playlist_musics")
+        connection.execute("ALTER TABLE playlist_musics_v2 RENAME TO playlist_musics")
+        logger.info("Migrated the playlists to reference musics by their id")
+
+    @staticmethod
+    def to_music(row: sqlite3.Row) -> MusicType:
+        return {column: row[column] for column in MUSIC_COLUMNS}
+
+    def musics(self) -> list[MusicType]:
+        with self.transaction() as connection:
+            rows = connection.execute("SELECT * FROM musics ORDER BY position")
+            return [self.to_music(row) for row in rows]
+
+    def get_music(self, video_id: str) -> Optional[MusicType]:
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT * FROM musics WHERE id = ?", (video_id,)
+            ).fetchone()
+            return None if row is None else self.to_music(row)
+
+    def find_musics(self, data_name: str, value: str) -> list[MusicType]:
+        """
+        case insensitive lookup by "title" or "author", goes through the index
+        """
+        if data_name not in ("title", "author"):
+            raise ValueError(f"Cannot look up musics by {data_name}")
+
+        with self.transaction() as connection:
+            rows = connection.execute(
+                f"""
+                SELECT * FROM musics WHERE {data_name} = ? COLLATE NOCASE
+                ORDER BY position
+                """,
+                (value,),
+            )
+            return [self.to_music(row) for row in rows]
+
+    def add_music(self, music: MusicType):
+        self.add_musics([music])
+
+    def add_musics(self, musics: list[MusicType]):
+        """
+        adds the musics after the others in a single transaction
+        """
+        with self.transaction() as connection:
+            position = connection.execute(
+                "SELECT COALESCE(MAX(position) + 1, 0) FROM musics"
+            ).fetchone()[0]
+            # an upsert instead of a replace, a replace would delete the music
+            # from every playlist first
+            connection.executemany(
+                """
+                INSERT INTO musics (id, position, title, author, volume_multiplier)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    title = excluded.title,
+                    author = excluded.author,
+                    volume_multiplier = excluded.volume_multiplier,
+                    loudness = NULL,
+                    true_peak = NULL,
+                    gain = NULL
+                """,
+                (
+                    (
+                        music["id"],
+                        position,
+                        music.get("title", ""),
+                        music.get("author", ""),
+                        music.get("volume_multiplier", 1.0),
+                    )
+                    for position, music in enumerate(musics, position)
+                ),
+            )
+
+    def update_music(self, video_id: str, data_name: str, data):
+        if data_name not in MUSIC_COLUMNS[1:]:
+            raise ValueError(f"Cannot update {data_name} of a music")
+
+        with self.transaction() as connection:
+            connection.execute(
+                f"UPDATE musics SET {data_name} = ? WHERE id = ?", (data, video_id)
+            )
+
+    def unanalyzed_musics(self) -> list[str]:
+        with self.transaction() as connection:
+            rows = connection.execute(
+                "SELECT id FROM musics WHERE gain IS NULL ORDER BY position"
+            )
+            return [row["id"] for row in rows]
+
+    def set_loudness(
+        self,
+        video_id: str,
+        loudness: Optional[float],
+        true_peak: Optional[float],
+        gain: float,
+    ):
+        with self.transaction() as connection:
+            connection.execute(
+                """
+                UPDATE musics SET loudness = ?, true_peak = ?, gain = ?
+                WHERE id = ?
+                """,
+                (loudness, true_peak, gain, video_id),
+            )
+
+    def remove_music(self, video_id: str):
+        with self.transaction() as connection:
+            row = connection.execute(
+                "SELECT position FROM musics WHERE id = ?", (video_id,)
+            ).fetchone()
+            if row is None:
+                return
+
+            connection.execute("DELETE FROM musics WHERE id = ?", (video_id,))
+            connection.execute(
+                "UPDATE musics SET position = position - 1 WHERE position > ?",
+                (row["position"],),
+            )
+
+    def set_order(self, video_ids: list[str], start: int = 0):
+        """
+        the musics in video_ids take the positions from start on
+        """
+        with self.transaction() as connection:
+            connection.executemany(
+                "UPDATE musics SET position = ? WHERE id = ?",
+                enumerate(video_ids, start),
+            )
+
+    def playlists(self) -> list[str]:
+        with self.transaction() as connection:
+            rows = connection.execute("SELECT name FROM playlists ORDER BY name")
+            return [row["name"] for row in rows]
+
+    def has_playlist(self, name: str) -> bool:
+        with self.transaction() as connection:
+            return (
+                connection.execute(
+                    "SELECT 1 FROM playlists WHERE name = ?", (name,)
+                ).fetchone()
+                is not None
+            )
+
+    def add_playlist(self, name: str):
+        with self.transaction() as connection:
+            connection.execute("INSERT INTO playlists (name) VALUES (?)", (name,))
+
+    def remove_playlist(self, name: str):
+        with self.transaction() as connection:
+            connection.execute("DELETE FROM playlists WHERE name = ?", (name,))
+
+    def rename_playlist(self, old_name: str, new_name: str):
+        with self.transaction() as connection:
+            connection.execute(
+                "UPDATE playlists SET name = ? WHERE name = ?", (new_name, old_name)
+            )
+
+    def playlist_musics(self, name: str) -> list[dict]:
+        """
+        returns the entries of the playlist as {"id", "title", "author"},
+        where title and author are only there if they were overridden
+        """
+        with self.transaction() as connection:
+            rows = connection.execute(
+                """
+                SELECT music_id, title, author FROM playlist_musics
+                WHERE playlist = ? ORDER BY position
+                """,
+                (name,),
+            )
+
+            musics = list()
+            for row in rows:
+                music = {"id": row["music_id"]}
+                if row["title"] is not None:
+                    music["title"] = row["title"]
+                if row["author"] is not None:
+                    music["author"] = row["author"]
+                musics.append(music)
+            return musics
+
+    def save_playlist(self, name: str, musics: list[dict]):
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO playlists (name) VALUES (?)", (name,)
+            )
+            connection.execute(
+                "DELETE FROM playlist_musics WHERE playlist = ?", (name,)
+            )
+            connection.executemany(
+                """
+                INSERT INTO playlist_musics
+                    (playlist, position, music_id, title, author)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (
+                    (
+                        name,
+                        position,
+                        music["id"],
+                        music.get("title"),
+                        music.get("author"),
+                    )
+                    for position, music in enumerate(musics)
+                ),
+            )
@@ -1,32 +1,10 @@
-import logging
-import sys
-import app
+import multiprocessing
 import os
-import coloredlogs
-
-os.environ["QT_MULTIMEDIA_PREFERRED_PLUGINS"] = "windowsmediafoundation"
-try:
-    os.makedirs("./thumbnails")
-    os.makedirs("./playlists")
-    if not os.path.exists(PLAYLIST_DIRECTORY + "downloads.json"):
-        with open(PLAYLIST_DIRECTORY + "downloads.json", mode="w+") as file:
-            file.write("{ musics: [] }")
-except Exception:
-    pass
-
-from PyQt6.QtWidgets import QApplication, QMessageBox, QWidget
-from app_settings import (
-    FORMAT,
-    IMAGE_RESOURCES,
-    LOGGING_LEVEL,
-    PLAYLIST_DIRECTORY,
-)
-from PyQt6 import QtCore
-
-coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
-logger = logging.getLogger(__name__)
+import sys
 
-QtCore.QDir.addSearchPath("images", "resources/images/")
+# the loudness analyzer spawns its processes, and spawning runs this module
+# again in each of them as __mp_main__, so Qt and the app are only imported
+# in main(), the analyzer processes import nothing but loudness
 
 
 def exception_hook(exctype, value, traceback):
@@ -35,7 +13,10 @@ def exception_hook(exctype, value, traceback):
     sys.exit(1)
 
 
-def check_resource(widget: QWidget):
+def check_resource(widget):
+    from PyQt6.QtWidgets import QMessageBox
+    from app_settings import IMAGE_RESOURCES
+
     for path in IMAGE_RESOURCES:
         if not os.path.exists(path):
             QMessageBox.critical(
@@ -47,6 +28,23 @@ def check_resource(widget: QWidget):
 
 
 def main():
+    os.environ["QT_MULTIMEDIA_PREFERRED_PLUGINS"] = "windowsmediafoundation"
+    try:
+        os.makedirs("./thumbnails")
+        os.makedirs("./playlists")
+    except Exception:
+        pass
+
+    import coloredlogs
+    import app
+
+    from PyQt6 import QtCore
+    from PyQt6.QtWidgets import QApplication
+    from app_settings import FORMAT, LOGGING_LEVEL
+
+    coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
+    QtCore.QDir.addSearchPath("images", "resources/images/")
+
     application = QApplication(sys.argv)
     widget = app.App()
 
@@ -57,6 +55,9 @@ def main():
 
 
 if __name__ == "__main__":
+    # the loudness analyzer spawns processes, frozen builds need this to run them
+    multiprocessing.freeze_support()
+
     sys._excepthook = sys.excepthook
     sys.excepthook = exception_hook
 
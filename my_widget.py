@@ -1,16 +1,32 @@
 import logging
-import json
 import os
 import coloredlogs
 import tasks
 import PyQt6.QtNetwork
 import enum
-import random
+
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import partial
+from itertools import islice, repeat
 
 from typing import Iterable, Optional
 from PyQt6 import QtGui
-from PyQt6.QtCore import QPoint, QThread, QUrl, Qt, pyqtSlot
-from PyQt6.QtGui import QAction, QBrush, QColor, QDropEvent, QPixmap, QResizeEvent, qRgb
+from PyQt6.QtCore import (
+    QAbstractProxyModel,
+    QAbstractTableModel,
+    QEvent,
+    QModelIndex,
+    QMutex,
+    QObject,
+    QPoint,
+    QThread,
+    QTimer,
+    QUrl,
+    Qt,
+    pyqtSlot,
+)
+from PyQt6.QtGui import QAction, QColor, QDropEvent, QImage, QPainter, QPixmap, qRgb
 from PyQt6.QtWidgets import (
     QAbstractItemView,
     QDialog,
@@ -24,22 +40,35 @@ from PyQt6.QtWidgets import (
     QMenu,
     QMessageBox,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QSlider,
+    QStyledItemDelegate,
+    QStyleOptionViewItem,
+    QTableView,
     QVBoxLayout,
     QWidget,
 )
 from app_settings import (
     CURRENT_PLAYING_SONG_COLOR,
+    DECODED_THUMBNAIL_CACHE_SIZE,
     DOWNLOAD_AUDIO_TO,
     DOWNLOADS_DIRECTORY,
     FORMAT,
     LOGGING_LEVEL,
-    PLAYLIST_DIRECTORY,
+    PLAYBACK_REFRESH_MS,
+    RESIZE_DEBOUNCE_MS,
+    SCALED_THUMBNAIL_CACHE_SIZE,
+    SEEK_TIMEOUT_MS,
+    SEEK_TOLERANCE_MS,
+    SHUFFLE_SEED,
     THUMBNAIL_FOLDER,
+    THUMBNAIL_HEIGHT_TO_WIDTH_RATIO,
+    THUMBNAIL_WIDTH_BUCKET,
 )
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput
 from PyQt6 import QtCore
+from library import Library
+from search_index import SearchIndex
+from shuffle import ShuffleQueue, moved_row
 from ui.add_playlist_ui import Ui_AddPlaylist
 from ui.music_setting import Ui_MusicSetting
 from PyQt6.QtWidgets import QProxyStyle, QStyle, QStyleOption, QStyleHintReturn
@@ -50,6 +79,18 @@ logger = logging.getLogger(__name__)
 PlaylistType = list[dict[str, str]]
 
 
+def move_items(items: list, source: int, count: int, destination: int):
+    """
+    moves count items at source in front of destination, destination counted
+    before the move
+    """
+    moved = items[source : source + count]
+    del items[source : source + count]
+    if destination > source:
+        destination -= count
+    items[destination:destination] = moved
+
+
 class QSliderDirectJumpStyle(QProxyStyle):
     def styleHint(
         self,
@@ -81,6 +122,13 @@ class DownloadButton(QPushButton):
         # )
         # self.player.play()
 
+    def mark_downloaded(self):
+        """
+        badge for search results that are already in the downloads
+        """
+        self.setText("Downloaded")
+        self.setToolTip("Already downloaded, click to download it again")
+
 
 class MyLineEdit(QLineEdit):
     def __init__(self, parent: QWidget):
@@ -97,9 +145,858 @@ class PlaybackMode(enum.Enum):
     Random = 3
 
 
-class Playlist(QTableWidget):
-    urls = dict()
+class PlaylistModel(QAbstractTableModel):
+    """
+    model behind the playlist view
+
+    every row only stores the raw thumbnail bytes, the video id, the title and
+    the author, the view only asks for the rows that are actually visible
+
+    the row of the music that is playing is kept as a single index, which
+    follows the rows as they're inserted, removed and moved, so changing it
+    never has to look at the other rows
+    """
+
+    HEADERS = ("Thumbnail", "Title", "Author")
+    ImageRole = Qt.ItemDataRole.UserRole + 1
+    VideoIdRole = Qt.ItemDataRole.UserRole + 2
+    NowPlayingRole = Qt.ItemDataRole.UserRole + 3
+
+    def __init__(self, parent: QtCore.QObject = None) -> None:
+        super().__init__(parent)
+
+        self.rows: list[dict] = list()
+        self.now_playing = -1
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ):
+        if (
+            orientation is Qt.Orientation.Horizontal
+            and role == Qt.ItemDataRole.DisplayRole
+        ):
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row = self.rows[index.row()]
+
+        match (index.column(), role):
+            case (0, PlaylistModel.ImageRole):
+                return row["image"]
+            case (0, PlaylistModel.VideoIdRole):
+                return row["id"]
+            case (1, Qt.ItemDataRole.DisplayRole | Qt.ItemDataRole.EditRole):
+                return row["title"]
+            case (2, Qt.ItemDataRole.DisplayRole | Qt.ItemDataRole.EditRole):
+                return row["author"]
+            case (1, Qt.ItemDataRole.ForegroundRole):
+                if index.row() == self.now_playing:
+                    return CURRENT_PLAYING_SONG_COLOR
+            case (_, PlaylistModel.NowPlayingRole):
+                return index.row() == self.now_playing
+        return None
+
+    def setData(
+        self, index: QModelIndex, value, role: int = Qt.ItemDataRole.EditRole
+    ) -> bool:
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+
+        match index.column():
+            case 1:
+                self.rows[index.row()]["title"] = value
+            case 2:
+                self.rows[index.row()]["author"] = value
+            case _:
+                return False
+
+        self.dataChanged.emit(
+            index, index, [Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole]
+        )
+        return True
+
+    def flags(self, index: QModelIndex) -> Qt.ItemFlag:
+        if not index.isValid():
+            return Qt.ItemFlag.ItemIsDropEnabled
+
+        flags = (
+            Qt.ItemFlag.ItemIsEnabled
+            | Qt.ItemFlag.ItemIsSelectable
+            | Qt.ItemFlag.ItemIsDragEnabled
+        )
+        if index.column() != 0:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def supportedDropActions(self) -> Qt.DropAction:
+        return Qt.DropAction.MoveAction | Qt.DropAction.CopyAction
+
+    def set_image(self, row: int, data: bytes):
+        self.rows[row]["image"] = data
+        index = self.index(row, 0)
+        self.dataChanged.emit(index, index, [PlaylistModel.ImageRole])
+
+    def push_row(self, data: bytes, title: str, author: str, video_id: str = ""):
+        self.insert_row(len(self.rows), data, title, author, video_id)
+
+    def insert_row(
+        self, row: int, data: bytes, title: str, author: str, video_id: str = ""
+    ):
+        self.insert_rows(
+            row,
+            [
+                {
+                    "id": video_id,
+                    "image": data,
+                    "title": title,
+                    "author": author,
+                }
+            ],
+        )
+
+    def insert_rows(self, row: int, rows: list[dict]):
+        self.beginInsertRows(QModelIndex(), row, row + len(rows) - 1)
+        self.rows[row:row] = rows
+        if self.now_playing >= row:
+            self.now_playing += len(rows)
+        self.endInsertRows()
+
+    def take_row(self, row: int) -> dict:
+        self.beginRemoveRows(QModelIndex(), row, row)
+        data = self.rows.pop(row)
+        if self.now_playing == row:
+            self.now_playing = -1
+        elif self.now_playing > row:
+            self.now_playing -= 1
+        self.endRemoveRows()
+        return data
+
+    def moveRows(
+        self,
+        source_parent: QModelIndex,
+        source_row: int,
+        count: int,
+        destination_parent: QModelIndex,
+        destination_child: int,
+    ) -> bool:
+        # refused when the rows would stay where they are
+        if not self.beginMoveRows(
+            source_parent,
+            source_row,
+            source_row + count - 1,
+            destination_parent,
+            destination_child,
+        ):
+            return False
+
+        move_items(self.rows, source_row, count, destination_child)
+        if self.now_playing != -1:
+            self.now_playing = moved_row(
+                self.now_playing, source_row, count, destination_child
+            )
+        self.endMoveRows()
+        return True
+
+    def clear(self):
+        self.beginResetModel()
+        self.rows.clear()
+        self.now_playing = -1
+        self.endResetModel()
+
+    def set_now_playing(self, row: int):
+        """
+        highlights row as the one playing, -1 for none
+        """
+        if not 0 <= row < len(self.rows):
+            row = -1
+        if row == self.now_playing:
+            return
+
+        previous, self.now_playing = self.now_playing, row
+        for changed in (previous, row):
+            if changed != -1:
+                self.dataChanged.emit(
+                    self.index(changed, 0),
+                    self.index(changed, self.columnCount() - 1),
+                    [Qt.ItemDataRole.ForegroundRole, PlaylistModel.NowPlayingRole],
+                )
+
+
+class PlaylistFilterModel(QAbstractProxyModel):
+    """
+    shows the rows of a PlaylistModel whose musics are in a set of matches
+
+    the rows shown are kept as a sorted list of source rows, so a new set of
+    matches is one reset of the view and the view only maps the rows it
+    paints, QSortFilterProxyModel would call into python for every row
+    """
+
+    def __init__(self, parent: QtCore.QObject = None) -> None:
+        super().__init__(parent)
+
+        # the ids of the musics shown, None shows every row
+        self.matches: Optional[set[str]] = None
+        # the source rows shown, None while every row is
+        self.shown: Optional[list[int]] = None
+
+    def setSourceModel(self, model: PlaylistModel):
+        super().setSourceModel(model)
+
+        model.rowsAboutToBeInserted.connect(self.source_rows_about_to_be_inserted)
+        model.rowsInserted.connect(self.source_rows_inserted)
+        model.rowsAboutToBeRemoved.connect(self.source_rows_about_to_be_removed)
+        model.rowsRemoved.connect(self.source_rows_removed)
+        model.rowsAboutToBeMoved.connect(self.source_rows_about_to_be_moved)
+        model.rowsMoved.connect(self.source_rows_moved)
+        model.modelAboutToBeReset.connect(self.beginResetModel)
+        model.modelReset.connect(self.source_reset)
+        model.dataChanged.connect(self.source_data_changed)
+
+    def set_matches(
+        self, matches: Optional[set[str]], shown: Optional[list[int]] = None
+    ):
+        """
+        shown are the sorted source rows of the matches, if the caller already
+        knows them, otherwise every row is looked at
+        """
+        self.beginResetModel()
+        self.matches = matches
+        if matches is None or shown is None:
+            shown = self.filter(0, self.sourceModel().rowCount())
+        self.shown = shown
+        self.endResetModel()
+
+    def filter(self, start: int, end: int) -> Optional[list[int]]:
+        """
+        the source rows in [start, end) that are shown, None if every row is
+        """
+        if self.matches is None:
+            return None
+
+        rows = islice(self.sourceModel().rows, start, end)
+        return [
+            row for row, data in enumerate(rows, start) if data["id"] in self.matches
+        ]
+
+    def index(
+        self, row: int, column: int, parent: QModelIndex = QModelIndex()
+    ) -> QModelIndex:
+        if parent.isValid() or not self.hasIndex(row, column):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index: QModelIndex = QModelIndex()) -> QModelIndex:
+        return QModelIndex()
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ):
+        # the rows keep the numbers they have in the playlist, the vertical
+        # header asks for hundreds of them at every layout
+        if orientation is Qt.Orientation.Vertical and self.shown is not None:
+            if not 0 <= section < len(self.shown):
+                return None
+            section = self.shown[section]
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        if self.shown is None:
+            return self.sourceModel().rowCount()
+        return len(self.shown)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else self.sourceModel().columnCount()
+
+    def mapToSource(self, proxy_index: QModelIndex) -> QModelIndex:
+        if not proxy_index.isValid():
+            return QModelIndex()
+
+        row = proxy_index.row()
+        if self.shown is not None:
+            row = self.shown[row]
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index: QModelIndex) -> QModelIndex:
+        if not source_index.isValid():
+            return QModelIndex()
+
+        row = source_index.row()
+        if self.shown is not None:
+            position = bisect_left(self.shown, row)
+            if position == len(self.shown) or self.shown[position] != row:
+                return QModelIndex()
+            row = position
+        return self.index(row, source_index.column())
+
+    def source_rows_about_to_be_inserted(self, _: QModelIndex, first: int, last: int):
+        if self.shown is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def source_rows_inserted(self, _: QModelIndex, first: int, last: int):
+        if self.shown is None:
+            self.endInsertRows()
+            return
+
+        count = last - first + 1
+        position = bisect_left(self.shown, first)
+        inserted = self.filter(first, last + 1)
+        after = [row + count for row in self.shown[position:]]
+        if not inserted:
+            self.shown[position:] = after
+            return
+
+        self.beginInsertRows(QModelIndex(), position, position + len(inserted) - 1)
+        self.shown[position:] = inserted + after
+        self.endInsertRows()
+
+    def source_rows_about_to_be_removed(self, _: QModelIndex, first: int, last: int):
+        if self.shown is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+
+        # the rows after them are renumbered once the source removed them
+        start, end = bisect_left(self.shown, first), bisect_right(self.shown, last)
+        if start < end:
+            self.beginRemoveRows(QModelIndex(), start, end - 1)
+            del self.shown[start:end]
+            self.endRemoveRows()
+
+    def source_rows_removed(self, _: QModelIndex, first: int, last: int):
+        if self.shown is None:
+            self.endRemoveRows()
+            return
+
+        count = last - first + 1
+        position = bisect_left(self.shown, first)
+        self.shown[position:] = [row - count for row in self.shown[position:]]
+
+    def source_rows_about_to_be_moved(
+        self, _: QModelIndex, start: int, end: int, __: QModelIndex, destination: int
+    ):
+        if self.shown is None:
+            self.beginMoveRows(QModelIndex(), start, end, QModelIndex(), destination)
+        else:
+            self.layoutAboutToBeChanged.emit()
+
+    def source_rows_moved(
+        self, _: QModelIndex, start: int, end: int, __: QModelIndex, destination: int
+    ):
+        if self.shown is None:
+            self.endMoveRows()
+            return
+
+        # the rows shown keep being shown, only their order changes
+        count = end - start + 1
+        persistent = self.persistentIndexList()
+        moved = [
+            moved_row(self.shown[index.row()], start, count, destination)
+            for index in persistent
+        ]
+        self.shown = sorted(
+            moved_row(row, start, count, destination) for row in self.shown
+        )
+        self.changePersistentIndexList(
+            persistent,
+            [
+                self.index(bisect_left(self.shown, row), index.column())
+                for row, index in zip(moved, persistent)
+            ],
+        )
+        self.layoutChanged.emit()
+
+    def source_reset(self):
+        self.shown = self.filter(0, self.sourceModel().rowCount())
+        self.endResetModel()
+
+    def source_data_changed(
+        self, top_left: QModelIndex, bottom_right: QModelIndex, roles: list[int]
+    ):
+        start, end = top_left.row(), bottom_right.row() + 1
+        if self.shown is not None:
+            start = bisect_left(self.shown, start)
+            end = bisect_left(self.shown, end)
+        if start < end:
+            self.dataChanged.emit(
+                self.index(start, top_left.column()),
+                self.index(end - 1, bottom_right.column()),
+                roles,
+            )
+
+
+class ThumbnailCache:
+    """
+    decoded and scaled thumbnails keyed by (video id, target width bucket)
+
+    the raw bytes are decoded at most once while the video stays in the cache,
+    every rescale afterwards starts from the decoded image
+    """
+
+    def __init__(
+        self,
+        decoded_size: int = DECODED_THUMBNAIL_CACHE_SIZE,
+        scaled_size: int = SCALED_THUMBNAIL_CACHE_SIZE,
+    ) -> None:
+        self.decoded_size = decoded_size
+        self.scaled_size = scaled_size
+
+        self.decoded: OrderedDict[str, QImage] = OrderedDict()
+        self.scaled: OrderedDict[tuple[str, int], QPixmap] = OrderedDict()
+
+    @staticmethod
+    def bucket(width: int) -> int:
+        return max(
+            THUMBNAIL_WIDTH_BUCKET,
+            width // THUMBNAIL_WIDTH_BUCKET * THUMBNAIL_WIDTH_BUCKET,
+        )
+
+    def get(self, video_id: str, data: bytes, width: int) -> QPixmap:
+        key = (video_id, self.bucket(width))
+
+        pixmap = self.scaled.get(key)
+        if pixmap is not None:
+            self.scaled.move_to_end(key)
+            return pixmap
+
+        image = self.decode(video_id, data)
+        if image.isNull():
+            pixmap = QPixmap()
+        else:
+            pixmap = QPixmap.fromImage(
+                image.scaled(
+                    key[1],
+                    int(key[1] * THUMBNAIL_HEIGHT_TO_WIDTH_RATIO),
+                    aspectRatioMode=Qt.AspectRatioMode.KeepAspectRatio,
+                    transformMode=Qt.TransformationMode.SmoothTransformation,
+                )
+            )
+
+        self.scaled[key] = pixmap
+        if len(self.scaled) > self.scaled_size:
+            self.scaled.popitem(last=False)
+        return pixmap
+
+    def decode(self, video_id: str, data: bytes) -> QImage:
+        image = self.decoded.get(video_id)
+        if image is not None:
+            self.decoded.move_to_end(video_id)
+            return image
+
+        image = QImage()
+        image.loadFromData(data)
+
+        self.decoded[video_id] = image
+        if len(self.decoded) > self.decoded_size:
+            self.decoded.popitem(last=False)
+        return image
+
+    def invalidate(self, video_id: str):
+        self.decoded.pop(video_id, None)
+        for key in [key for key in self.scaled if key[0] == video_id]:
+            del self.scaled[key]
+
+
+class PlaylistDelegate(QStyledItemDelegate):
+    """
+    paints the thumbnail column from the thumbnail cache, the title and the
+    author are painted by QStyledItemDelegate as usual
+    """
+
+    thumbnail_cache = ThumbnailCache()
+
+    def __init__(self, parent: QtCore.QObject = None) -> None:
+        super().__init__(parent)
+
+        # the width thumbnails are scaled to, it only changes once a resize has settled
+        self.thumbnail_width = 0
+
+    def paint(
+        self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex
+    ) -> None:
+        if index.column() != 0:
+            return super().paint(painter, option, index)
+
+        # draws the background, so the selection still covers the thumbnail
+        super().paint(painter, option, index)
+
+        image = self.thumbnail_cache.get(
+            index.data(PlaylistModel.VideoIdRole),
+            index.data(PlaylistModel.ImageRole),
+            self.thumbnail_width or option.rect.width(),
+        )
+        if image.isNull():
+            return
+
+        # while a resize is still going on the cached thumbnail is just stretched
+        # into the cell, it gets rescaled properly once the resize has settled
+        target = QtCore.QRect(
+            QPoint(0, 0),
+            image.size().scaled(option.rect.size(), Qt.AspectRatioMode.KeepAspectRatio),
+        )
+        target.moveTopLeft(
+            QPoint(
+                option.rect.left(),
+                option.rect.top() + (option.rect.height() - target.height()) // 2,
+            )
+        )
+        painter.drawPixmap(target, image)
+
+
+class PlaybackEngine(QObject):
+    """
+    two media players behind the interface of one, the active player plays
+    while the standby one already loads the music that comes next
+
+    setSource swaps the players when the standby one has the source, so moving
+    to a preloaded music doesn't wait for it to load, only the signals of the
+    active player are passed on
+    """
+
+    sourceChanged = QtCore.pyqtSignal(QUrl)
+    positionChanged = QtCore.pyqtSignal(int)
+    durationChanged = QtCore.pyqtSignal(int)
+    mediaStatusChanged = QtCore.pyqtSignal(object)
+    playbackStateChanged = QtCore.pyqtSignal(object)
+    errorOccurred = QtCore.pyqtSignal(object, str)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+
+        self.players: list[QMediaPlayer] = list()
+        for _ in range(2):
+            audio_output = QAudioOutput(self)
+            audio_output.setVolume(0.3)
+
+            player = QMediaPlayer(self)
+            player.setAudioOutput(audio_output)
+            for signal_name in (
+                "sourceChanged",
+                "positionChanged",
+                "durationChanged",
+                "mediaStatusChanged",
+                "playbackStateChanged",
+                "errorOccurred",
+            ):
+                getattr(player, signal_name).connect(
+                    partial(self.pass_on, player, getattr(self, signal_name))
+                )
+            self.players.append(player)
+
+        self.active, self.standby = self.players
+
+    def pass_on(self, player: QMediaPlayer, signal, *args):
+        if player is self.active:
+            signal.emit(*args)
+
+    def audio_output(self) -> QAudioOutput:
+        return self.active.audioOutput()
+
+    def preload(self, source: QUrl):
+        if self.standby.source() != source:
+            self.standby.setSource(source)
+
+    def setSource(self, source: QUrl):
+        if source.isEmpty():
+            # releases the files, so they can be deleted or replaced
+            self.standby.setSource(source)
+            self.active.setSource(source)
+            return
+
+        if self.standby.source() != source or self.standby.mediaStatus() in (
+            QMediaPlayer.MediaStatus.NoMedia,
+            QMediaPlayer.MediaStatus.InvalidMedia,
+        ):
+            self.active.setSource(source)
+            return
+
+        self.active.stop()
+        self.active, self.standby = self.standby, self.active
+        self.active.setPosition(0)
+
+        self.sourceChanged.emit(source)
+        self.durationChanged.emit(self.active.duration())
+        self.positionChanged.emit(0)
+
+    def release(self, source: QUrl) -> bool:
+        """
+        empties the players holding source, returns whether the active one did
+
+        nothing is passed on, the active player gets its source back once the
+        file is usable again
+        """
+        if self.standby.source() == source:
+            self.standby.setSource(QUrl())
+        if self.active.source() != source:
+            return False
+
+        self.blockSignals(True)
+        self.active.setSource(QUrl())
+        self.blockSignals(False)
+        return True
+
+    def source(self) -> QUrl:
+        return self.active.source()
+
+    def play(self):
+        self.active.play()
+
+    def pause(self):
+        self.active.pause()
+
+    def stop(self):
+        self.active.stop()
+
+    def setPosition(self, position: int):
+        self.active.setPosition(position)
+
+    def position(self) -> int:
+        return self.active.position()
+
+    def duration(self) -> int:
+        return self.active.duration()
+
+    def playbackState(self) -> QMediaPlayer.PlaybackState:
+        return self.active.playbackState()
+
+    def mediaStatus(self) -> QMediaPlayer.MediaStatus:
+        return self.active.mediaStatus()
+
+
+class PlaybackRefresher(QObject):
+    """
+    keeps the progress bar and the clocks up to date with the media player
+
+    the position is sampled every PLAYBACK_REFRESH_MS while the music plays
+    instead of on every positionChanged, and not at all while the window can't
+    be seen, the clock texts for every second of the music are made once when
+    its duration is known
+    """
+
+    def __init__(
+        self,
+        media_player: PlaybackEngine,
+        progress_bar: QSlider,
+        duration_passed: QLabel,
+        total_duration: QLabel,
+        window: QWidget,
+    ):
+        super().__init__(window)
+
+        self.media_player = media_player
+        self.progress_bar = progress_bar
+        self.duration_passed = duration_passed
+        self.total_duration = total_duration
+        self.window = window
+        # the native window, it's the one told when the window gets covered
+        self.window_handle = None
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(PLAYBACK_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+
+        self.time_texts = [self.time_text(0)]
+        self.shown_second = -1
+
+        self.media_player.durationChanged.connect(self.duration_changed)
+        self.media_player.positionChanged.connect(self.position_changed)
+        self.media_player.playbackStateChanged.connect(lambda _: self.update_timer())
+        self.window.installEventFilter(self)
+
+    @staticmethod
+    def time_text(seconds: int) -> str:
+        return f"{seconds // 60}:{seconds % 60:02d}"
+
+    def text(self, position: int) -> str:
+        second = max(position // 1000, 0)
+        if second < len(self.time_texts):
+            return self.time_texts[second]
+        return self.time_text(second)
+
+    def is_visible(self) -> bool:
+        if not self.window.isVisible() or self.window.isMinimized():
+            return False
+        return self.window_handle is None or self.window_handle.isExposed()
+
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        match event.type():
+            case (
+                QEvent.Type.Show
+                | QEvent.Type.Hide
+                | QEvent.Type.WindowStateChange
+                | QEvent.Type.Expose
+            ):
+                if self.window_handle is None and self.window.windowHandle():
+                    self.window_handle = self.window.windowHandle()
+                    self.window_handle.installEventFilter(self)
+                # the window only changes its state after the event
+                QTimer.singleShot(0, self.update_timer)
+        return False
+
+    def update_timer(self):
+        if not self.is_visible():
+            self.timer.stop()
+            return
+
+        if not self.timer.isActive():
+            self.refresh()
+
+        if self.media_player.playbackState() is QMediaPlayer.PlaybackState.PlayingState:
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def duration_changed(self, duration: int):
+        self.time_texts = [
+            self.time_text(second) for second in range(duration // 1000 + 1)
+        ]
+
+        self.progress_bar.blockSignals(True)
+        self.progress_bar.setMaximum(duration)
+        self.progress_bar.blockSignals(False)
+        self.total_duration.setText(self.text(duration))
+
+        self.shown_second = -1
+
+    def position_changed(self, position: int):
+        # while the music plays the timer takes care of it, so this only
+        # follows the seeks while it's paused
+        if not self.timer.isActive() and self.is_visible():
+            self.show_position(position)
+
+    def refresh(self):
+        self.show_position(self.media_player.position())
+
+    def show_position(self, position: int):
+        # the user is dragging it, the clock shows the preview meanwhile
+        if self.progress_bar.isSliderDown():
+            return
+
+        self.progress_bar.blockSignals(True)
+        self.progress_bar.setSliderPosition(position)
+        self.progress_bar.blockSignals(False)
+
+        second = position // 1000
+        if second != self.shown_second:
+            self.shown_second = second
+            self.duration_passed.setText(self.text(position))
+
+    def show_preview(self, position: int):
+        self.shown_second = position // 1000
+        self.duration_passed.setText(self.text(position))
+
+
+class SeekController(QObject):
+    """
+    seeks the media player to where the progress bar is moved
+
+    only one seek is sent at a time, it's done once the player reports a
+    position close to it, or after SEEK_TIMEOUT_MS, and the positions the bar
+    passes meanwhile are collapsed into the latest one, which is sent next
+
+    while the bar is dragged, seeks are also sent at most once every
+    SEEK_TIMEOUT_MS, and the position it's released at is always sent last
+    """
+
+    def __init__(
+        self,
+        media_player: PlaybackEngine,
+        progress_bar: QSlider,
+        refresher: PlaybackRefresher,
+    ):
+        super().__init__(progress_bar)
+
+        self.media_player = media_player
+        self.progress_bar = progress_bar
+        self.refresher = refresher
+
+        self.pending: Optional[int] = None
+        # the position of the seek in flight, None if there is none
+        self.target: Optional[int] = None
+
+        # a single shot, a seek in flight gives up on it, and while dragging
+        # the next seek waits for it
+        self.timeout_timer = QTimer(self)
+        self.timeout_timer.setSingleShot(True)
+        self.timeout_timer.setInterval(SEEK_TIMEOUT_MS)
+        self.timeout_timer.timeout.connect(self.timed_out)
+
+        self.progress_bar.valueChanged.connect(self.value_changed)
+        self.progress_bar.sliderReleased.connect(
+            lambda: self.request(self.progress_bar.value())
+        )
+        self.media_player.positionChanged.connect(self.position_changed)
+
+    def value_changed(self, value: int):
+        if self.progress_bar.isSliderDown():
+            self.refresher.show_preview(value)
+        self.request(value)
+
+    def request(self, position: int):
+        if position == self.target:
+            # already on its way
+            self.pending = None
+            return
+
+        self.pending = position
+        if self.target is None and not (
+            self.progress_bar.isSliderDown() and self.timeout_timer.isActive()
+        ):
+            self.seek()
+
+    def seek(self):
+        position, self.pending = self.pending, None
+
+        self.target = position
+        self.timeout_timer.start()
+        self.media_player.setPosition(position)
+
+    def position_changed(self, position: int):
+        # the ticks of the playback before the seek lands are no answer to it
+        if self.target is None or abs(position - self.target) > SEEK_TOLERANCE_MS:
+            return
+
+        self.target = None
+        if self.progress_bar.isSliderDown():
+            # throttled, the timeout sends the pending position
+            return
+
+        self.timeout_timer.stop()
+        if self.pending is not None:
+            self.seek()
+
+    def timed_out(self):
+        self.target = None
+        if self.pending is not None:
+            self.seek()
+
+
+class Playlist(QTableView):
+    # opened by App, importing this module never touches the library file
+    library: Optional[Library] = None
+    musics: PlaylistType = list()
     images = list()
+    # video id -> index of the music in Playlist.musics and Playlist.images
+    id_index: dict[str, int] = dict()
+    search_index = SearchIndex()
+    # the loader and the downloads push musics from their own threads
+    mutex = QMutex()
     has_music = QtCore.pyqtSignal(int)
 
     playback_mode = PlaybackMode.Loop
@@ -114,16 +1011,29 @@ class Playlist(QTableWidget):
             self.top_widget: QWidget = self.top_widget.parent()
         self.top_widget: App = self.top_widget
 
+        self.playlist_model = PlaylistModel(self)
+        # the view shows the rows through it, every row number the playlist
+        # works with is one of self.playlist_model
+        self.filter_model = PlaylistFilterModel(self)
+        self.filter_model.setSourceModel(self.playlist_model)
+        self.setModel(self.filter_model)
+        self.playlist_delegate = PlaylistDelegate(self)
+        self.setItemDelegate(self.playlist_delegate)
+
+        self.resize_timer = QTimer(self)
+        self.resize_timer.setSingleShot(True)
+        self.resize_timer.setInterval(RESIZE_DEBOUNCE_MS)
+        self.resize_timer.timeout.connect(self.rescale_thumbnails)
+
         self.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.verticalHeader().setSectionResizeMode(
-            QHeaderView.ResizeMode.ResizeToContents
-        )
-        self.setHorizontalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
-        self.setVerticalScrollMode(QTableWidget.ScrollMode.ScrollPerPixel)
+        # every row has the same height, so the view never has to ask every row for its size
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.setHorizontalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
+        self.setVerticalScrollMode(QTableView.ScrollMode.ScrollPerPixel)
 
         self.verticalScrollBar().setSingleStep(20)
 
-        self.referencing_url = Playlist.urls
+        self.referencing_musics = Playlist.musics
         self.referencing_images = Playlist.images
 
         self.is_downloads_playlist = True
@@ -131,15 +1041,20 @@ class Playlist(QTableWidget):
         self.playlist_loading_thread = QThread()
         self.playlist_loader = tasks.PlaylistLoader(self)
 
-        self.audio_output = QAudioOutput()
-        self.audio_output.setVolume(0.3)
-
-        self.media_player = QMediaPlayer()
-        self.media_player.setAudioOutput(self.audio_output)
+        self.media_player = PlaybackEngine(self)
 
         self.current_playing_index = -1
-
-        self.cellClicked.connect(self.change_music)
+        # the id and the position of the music a download released the file
+        # of, it continues from there once it's loaded again
+        self.released_music: Optional[tuple[str, int]] = None
+        self.resume_position: Optional[int] = None
+        # the query the rows are filtered by
+        self.filter_query = ""
+        # the order of the random playback mode, it follows every row added or removed
+        self.shuffle = ShuffleQueue(SHUFFLE_SEED)
+
+        self.clicked.connect(self.change_music)
+        self.playlist_model.dataChanged.connect(self.item_edited)
 
         self.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
         self.customContextMenuRequested.connect(self.show_custom_context_menu)
@@ -207,11 +1122,13 @@ class Playlist(QTableWidget):
     def save_music_setting(self):
         music_setting = self.music_setting_ui
 
-        self.set_data(music_setting.title.text(), "title", self.currentRow())
-        self.item(self.currentRow(), 1).setText(music_setting.title.text())
-
-        self.set_data(music_setting.author.text(), "author", self.currentRow())
-        self.item(self.currentRow(), 2).setText(music_setting.title.text())
+        # goes through self.item_edited, which saves the new title and author
+        self.playlist_model.setData(
+            self.playlist_model.index(self.currentRow(), 1), music_setting.title.text()
+        )
+        self.playlist_model.setData(
+            self.playlist_model.index(self.currentRow(), 2), music_setting.author.text()
+        )
 
         self.set_data(
             music_setting.current_multiplier.value() / 100,
@@ -240,33 +1157,96 @@ class Playlist(QTableWidget):
         self.is_downloads_playlist = True
 
         self.referencing_images = Playlist.images
-        self.referencing_url = Playlist.urls
-
-        self.setRowCount(0)
+        self.referencing_musics = Playlist.musics
 
-        if "musics" not in self.urls:
-            self.urls["musics"] = list()
+        self.playlist_model.clear()
 
-        for index, music_data in enumerate(self.urls["musics"]):
+        rows = list()
+        for index, music_data in enumerate(self.musics):
             try:
                 title = music_data["title"]
                 author = music_data["author"]
             except Exception as error:
                 logger.error("Error Occurred: %s", error)
                 continue
-            self.push_item(self.images[index], title, author)
+            rows.append(
+                {
+                    "id": music_data["id"],
+                    "image": self.images[index],
+                    "title": title,
+                    "author": author,
+                }
+            )
+        self.push_items(rows)
 
-    @pyqtSlot(bytes, str, str)
-    def push_item(self, data: bytes, title: str, author: str):
-        self.insertRow(self.rowCount())
-        image = QPixmap()
-        image.loadFromData(data)
-        image_label = QLabel()
-        image_label.setPixmap(image)
-        self.setCellWidget(self.rowCount() - 1, 0, image_label)
-        self.setItem(self.rowCount() - 1, 1, QTableWidgetItem(title))
-        self.setItem(self.rowCount() - 1, 2, QTableWidgetItem(author))
-        self.resizeEvent(QResizeEvent(self.size(), self.size()))
+        self.filter_rows(self.filter_query)
+
+    @classmethod
+    def push_music(cls, music: dict, image_data: bytes):
+        """
+        add the music to the downloads in memory, or replace it if it's already there
+        """
+        cls.mutex.lock()
+        cls.search_index.add(music["id"], music["title"], music["author"])
+
+        index = cls.id_index.get(music["id"])
+        if index is None:
+            cls.id_index[music["id"]] = len(cls.musics)
+            cls.musics.append(music)
+            cls.images.append(image_data)
+        else:
+            cls.musics[index] = music
+            cls.images[index] = image_data
+        cls.mutex.unlock()
+
+    @classmethod
+    def reindex_musics(cls, start: int = 0, end: int = None):
+        """
+        update Playlist.id_index for the musics in [start, end) after they moved
+        """
+        if end is None:
+            end = len(cls.musics)
+
+        for index in range(start, end):
+            cls.id_index[cls.musics[index]["id"]] = index
+
+    @classmethod
+    def is_downloaded(cls, video_id: Optional[str]) -> bool:
+        return video_id in cls.id_index
+
+    @pyqtSlot(bytes, str, str, str)
+    def push_item(self, data: bytes, title: str, author: str, video_id: str = ""):
+        self.playlist_model.push_row(data, title, author, video_id)
+        self.shuffle.insert(self.rowCount() - 1)
+
+    def push_items(self, rows: list[dict]):
+        """
+        appends the rows to the view in a single insertion and shuffles the
+        random order again
+        """
+        if rows:
+            self.playlist_model.insert_rows(self.rowCount(), rows)
+        self.shuffle.reset(self.rowCount())
+
+    def rowCount(self) -> int:
+        return self.playlist_model.rowCount()
+
+    def currentRow(self) -> int:
+        return self.filter_model.mapToSource(self.currentIndex()).row()
+
+    def view_index(self, row: int, column: int = 0) -> QModelIndex:
+        """
+        the index of the view showing row, invalid if the filter hides it
+        """
+        return self.filter_model.mapFromSource(self.playlist_model.index(row, column))
+
+    def select_row(self, row: int):
+        index = self.view_index(row)
+        if index.isValid():
+            self.selectRow(index.row())
+
+    def text(self, row: int, column: int = 1) -> str:
+        return self.playlist_model.index(row, column).data()
 
     def load_music(self):
         self.playlist_loading_thread = QThread()
@@ -280,38 +1260,32 @@ class Playlist(QTableWidget):
         self.playlist_loading_thread.start()
 
     def load_from_playlist(self, playlist_name: str):
-        path_dir = PLAYLIST_DIRECTORY + playlist_name + ".json"
-
-        if not os.path.exists(path_dir):
+        if not self.library.has_playlist(playlist_name):
             return
 
         self.current_playlist_name = playlist_name
         self.is_downloads_playlist = False
 
         self.referencing_images = list()
-        self.referencing_url = dict()
-        self.referencing_url["musics"] = list()
+        self.referencing_musics = list()
 
-        with open(path_dir, mode="r") as file:
-            data = json.loads(file.read())
+        self.playlist_model.clear()
 
-        self.setRowCount(0)
-
-        for music_data in data["musics"]:
+        rows = list()
+        for music_data in self.library.playlist_musics(playlist_name):
             try:
-                index = music_data["index"]
+                url = music_data["id"]
+                index = self.id_index[url]
                 image = self.images[index]
-                url = self.urls["musics"][index]["id"]
-                title = music_data.get("title", self.urls["musics"][index]["title"])
-                author = music_data.get("author", self.urls["musics"][index]["author"])
+                title = music_data.get("title", self.musics[index]["title"])
+                author = music_data.get("author", self.musics[index]["author"])
                 volume_multiplier = music_data.get(
-                    "volume_multiplier", self.urls.get("volume_multiplier", 1.0)
+                    "volume_multiplier", self.musics[index]["volume_multiplier"]
                 )
 
-                self.referencing_url["musics"].append(
+                self.referencing_musics.append(
                     {
                         "id": url,
-                        "index": index,
                         "title": title,
                         "author": author,
                         "volume_multiplier": volume_multiplier,
@@ -321,65 +1295,138 @@ class Playlist(QTableWidget):
             except Exception as error:
                 logger.error("Error Occurred: %s", error)
                 continue
-            self.push_item(image, title, author)
+            rows.append({"id": url, "image": image, "title": title, "author": author})
+        self.push_items(rows)
 
-        logger.debug(self.referencing_url)
+        self.filter_rows(self.filter_query)
+        logger.debug(self.referencing_musics)
 
     def save_current_playlist(self):
         if self.is_downloads_playlist:
             logger.debug("returned")
             return
 
-        data = {"musics": []}
+        data = list()
 
-        for music in self.referencing_url["musics"]:
-            data["musics"].append(
+        for music in self.referencing_musics:
+            data.append(
                 {
-                    "index": music["index"],
+                    "id": music["id"],
                     "title": music["title"],
                     "author": music["author"],
                 }
             )
 
         logger.debug(data)
-        with open(
-            f"{PLAYLIST_DIRECTORY}{self.current_playlist_name}.json", mode="w"
-        ) as file:
-            file.write(json.dumps(data, indent=2))
+        self.library.save_playlist(self.current_playlist_name, data)
 
     def resizeEvent(self, e: QtGui.QResizeEvent) -> None:
-        for i in range(self.rowCount()):
-            data = self.referencing_images[i]
-            image = QPixmap()
-            image.loadFromData(data)
-
-            height_to_width_ratio = image.height() / image.width()
-            reduced_width = int(self.width() / 3)
-            reduced_height = int(reduced_width * height_to_width_ratio)
-
-            image = image.scaled(
-                reduced_width,
-                reduced_height,
-                aspectRatioMode=Qt.AspectRatioMode.KeepAspectRatio,
-                transformMode=Qt.TransformationMode.SmoothTransformation,
-            )
-            label = QLabel()
-            label.setPixmap(image)
-            self.setCellWidget(i, 0, label)
+        reduced_width = int(self.width() / 3)
+        reduced_height = int(reduced_width * THUMBNAIL_HEIGHT_TO_WIDTH_RATIO)
+        self.verticalHeader().setDefaultSectionSize(max(reduced_height, 1))
+
+        # thumbnails are only rescaled once the user stops dragging the window
+        self.resize_timer.start()
 
         return super().resizeEvent(e)
 
+    def filter_rows(self, query: str):
+        """
+        shows only the rows of the musics the library search finds for query,
+        an empty query shows every row again
+
+        the filter model swaps every row at once, the current and the selected
+        rows are put back afterwards
+        """
+        self.filter_query = query
+        matches = self.search_index.search(query)
+        if matches is None and self.filter_model.matches is None:
+            return
+
+        current = self.currentRow()
+        selected = [
+            self.filter_model.mapToSource(index).row()
+            for index in self.selectionModel().selectedRows()
+        ]
+
+        shown = None
+        if matches is not None and self.is_downloads_playlist:
+            # the rows of the downloads follow Playlist.id_index, the musics
+            # the loader hasn't pushed to the view yet land past the last row
+            count = self.rowCount()
+            shown = sorted(map(self.id_index.get, matches, repeat(count)))
+            del shown[bisect_left(shown, count) :]
+        self.filter_model.set_matches(matches, shown)
+
+        selection = QtCore.QItemSelection()
+        for row in selected:
+            index = self.view_index(row)
+            if index.isValid():
+                selection.select(
+                    index,
+                    index.siblingAtColumn(self.playlist_model.columnCount() - 1),
+                )
+        self.selectionModel().select(
+            selection, QtCore.QItemSelectionModel.SelectionFlag.Select
+        )
+        index = self.view_index(current)
+        if index.isValid():
+            self.selectionModel().setCurrentIndex(
+                index, QtCore.QItemSelectionModel.SelectionFlag.NoUpdate
+            )
+
+    def refresh_thumbnail(self, video_id: str):
+        """
+        shows the thumbnail Playlist.images holds for video_id now, in every
+        row of it
+        """
+        self.playlist_delegate.thumbnail_cache.invalidate(video_id)
+        index = self.id_index.get(video_id)
+        if index is None:
+            return
+
+        for row, data in enumerate(self.playlist_model.rows):
+            if data["id"] == video_id:
+                self.referencing_images[row] = self.images[index]
+                self.playlist_model.set_image(row, self.images[index])
+
+    def rescale_thumbnails(self):
+        self.playlist_delegate.thumbnail_width = int(self.width() / 3)
+        # only the visible rows are repainted, so only those get rescaled
+        self.viewport().update()
+
     def get_data(self, data_name: str = "id", index: int = None, default_value=None):
         if index is None:
             index = self.current_playing_index
 
         try:
-            return self.referencing_url["musics"][index][data_name]
+            return self.referencing_musics[index][data_name]
         except Exception:
             return default_value
 
+    def output_volume(self, volume: int, index: int = None) -> float:
+        """
+        the volume setting scaled by the analyzed gain and the volume multiplier
+        of the music
+        """
+        music_index = self.id_index.get(self.get_data(index=index))
+        gain = 1.0
+        if music_index is not None:
+            gain = self.musics[music_index].get("gain") or 1.0
+
+        volume_multiplier = self.get_data("volume_multiplier", index, 1)
+        return min(volume / 100 * gain * volume_multiplier, 1.0)
+
     def set_data(self, data, data_name: str = "id", index: int = None):
-        self.referencing_url["musics"][index][data_name] = data
+        self.referencing_musics[index][data_name] = data
+
+        if self.is_downloads_playlist:
+            music = self.referencing_musics[index]
+            self.library.update_music(music["id"], data_name, data)
+            if data_name in ("title", "author"):
+                self.search_index.add(music["id"], music["title"], music["author"])
+        else:
+            self.save_current_playlist()
 
     def change_music(self):
         if self.current_playing_index == self.currentRow():
@@ -402,10 +1449,13 @@ class Playlist(QTableWidget):
         if self.rowCount() <= 0:
             return
 
-        text = self.item(delete_row, 1).text()
+        text = self.text(delete_row)
         url = self.get_data(index=delete_row)
 
-        self.removeRow(delete_row)
+        self.playlist_model.take_row(delete_row)
+        self.shuffle.remove(delete_row)
+        # the rows after it moved up, -1 if it was the one playing
+        self.current_playing_index = self.playlist_model.now_playing
 
         self.media_player.setSource(QUrl())
 
@@ -419,6 +1469,10 @@ class Playlist(QTableWidget):
                     f"Failed to remove audio! Error: {error}",
                 )
 
+            self.library.remove_music(url)
+            self.search_index.remove(url)
+            self.playlist_delegate.thumbnail_cache.invalidate(url)
+
             try:
                 os.remove(THUMBNAIL_FOLDER + url)
             except Exception as error:
@@ -428,9 +1482,14 @@ class Playlist(QTableWidget):
                     f"Failed to remove thumbnail! Error: {error}",
                 )
 
-        del self.referencing_url["musics"][delete_row]
+        del self.referencing_musics[delete_row]
         del self.referencing_images[delete_row]
 
+        if self.is_downloads_playlist:
+            # playlists reference the music by its id, the library drops it from them
+            del self.id_index[url]
+            self.reindex_musics(delete_row)
+
         self.save_current_playlist()
 
         QMessageBox.information(
@@ -442,7 +1501,7 @@ class Playlist(QTableWidget):
     def show_add_widget(self):
         self.download_musics_listwidget.clear()
 
-        for music in self.urls["musics"]:
+        for music in self.musics:
             self.download_musics_listwidget.addItem(music["title"])
             self.download_musics_listwidget.setMinimumWidth(
                 self.download_musics_listwidget.sizeHintForColumn(0)
@@ -473,17 +1532,17 @@ class Playlist(QTableWidget):
         music_setting_action.triggered.connect(
             lambda: (
                 self.music_setting_ui.author.setText(
-                    self.referencing_url["musics"][self.currentRow()]["author"]
+                    self.referencing_musics[self.currentRow()]["author"]
                 ),
                 self.music_setting_ui.title.setText(
-                    self.referencing_url["musics"][self.currentRow()]["title"]
+                    self.referencing_musics[self.currentRow()]["title"]
                 ),
                 self.music_setting_ui.current_multiplier.setRange(
                     0, int(1 / (self.top_widget.ui.volume_bar.value() / 100) * 100)
                 ),
                 self.music_setting_ui.current_multiplier.setValue(
                     int(
-                        self.referencing_url["musics"][self.currentRow()][
+                        self.referencing_musics[self.currentRow()][
                             "volume_multiplier"
                         ]
                         * 100
@@ -491,7 +1550,7 @@ class Playlist(QTableWidget):
                 ),
                 self.music_setting_ui.current_multiplier_label.setText(
                     str(
-                        self.referencing_url["musics"][self.currentRow()][
+                        self.referencing_musics[self.currentRow()][
                             "volume_multiplier"
                         ]
                     )
@@ -512,16 +1571,22 @@ class Playlist(QTableWidget):
         Returns:
                 bool: [returns true if the next song is none, and the start over is set to false]
         """
-        index = self.current_playing_index + 1
-
-        if index >= len(self.referencing_url["musics"]):
-            if start_over:
-                index = 0
-            else:
+        if self.playback_mode is PlaybackMode.Random:
+            self.sync_shuffle()
+            index = self.shuffle.advance()
+            if index is None:
                 return True
+        else:
+            index = self.current_playing_index + 1
+
+            if index >= len(self.referencing_musics):
+                if start_over:
+                    index = 0
+                else:
+                    return True
 
         self.current_playing_index = index
-        self.selectRow(self.current_playing_index)
+        self.select_row(self.current_playing_index)
         self.media_player.setSource(
             QUrl.fromLocalFile(DOWNLOADS_DIRECTORY + self.get_data())
         )
@@ -529,12 +1594,18 @@ class Playlist(QTableWidget):
 
     def backward(self):
         index = self.current_playing_index - 1
+        if self.playback_mode is PlaybackMode.Random:
+            # the music played before this one, if there's any
+            self.sync_shuffle()
+            previous = self.shuffle.back()
+            if previous is not None:
+                index = previous
 
         if index < 0:
-            index = len(self.referencing_url["musics"]) - 1
+            index = len(self.referencing_musics) - 1
 
         self.current_playing_index = index
-        self.selectRow(self.current_playing_index)
+        self.select_row(self.current_playing_index)
         self.media_player.setSource(
             QUrl.fromLocalFile(DOWNLOADS_DIRECTORY + self.get_data())
         )
@@ -544,30 +1615,84 @@ class Playlist(QTableWidget):
             self.media_player.playbackState() is QMediaPlayer.PlaybackState.PlayingState
         ) or self.top_widget.ui.resume_button.isVisible()
 
-        volume_multiplier = self.referencing_url["musics"][self.current_playing_index][
-            "volume_multiplier"
-        ]
-
-        new_volume = tasks.Settings.volume / 100 * volume_multiplier
-        if new_volume > 1.0:
-            new_volume = 1.0
-        self.audio_output.setVolume(new_volume)
+        self.audio_output.setVolume(self.output_volume(tasks.Settings.volume))
 
         if is_playing:
             self.media_player.play()
 
-        for row in range(self.rowCount()):
-            item = self.item(row, 1)
-            if item.foreground() == QBrush(CURRENT_PLAYING_SONG_COLOR):
-                item.setForeground(QColor(0, 0, 0))
-                break
+        self.playlist_model.set_now_playing(self.current_playing_index)
 
-        if self.item(self.current_playing_index, 1) is not None:
-            self.item(self.current_playing_index, 1).setForeground(
-                CURRENT_PLAYING_SONG_COLOR
-            )
+        if 0 <= self.current_playing_index < self.rowCount():
+            # musics picked by hand or by the other modes count as played too
+            if len(self.shuffle) == self.rowCount():
+                self.shuffle.jump(self.current_playing_index)
 
         self.has_music.emit(self.current_playing_index)
+        self.preload_next()
+
+    def preload_next(self):
+        next_index = self.next_index()
+        if next_index is not None:
+            self.media_player.preload(
+                QUrl.fromLocalFile(
+                    DOWNLOADS_DIRECTORY + self.get_data(index=next_index)
+                )
+            )
+
+    @pyqtSlot(str)
+    def release_music(self, video_id: str):
+        """
+        lets go of the file of video_id in both players, a download is about
+        to replace it
+        """
+        position = self.media_player.position()
+        if self.media_player.release(
+            QUrl.fromLocalFile(DOWNLOADS_DIRECTORY + video_id)
+        ):
+            self.released_music = (video_id, position)
+
+    @pyqtSlot(str)
+    def reload_music(self, video_id: str):
+        """
+        loads the file of video_id again once the download replaced it
+        """
+        if self.released_music is None or self.released_music[0] != video_id:
+            # at most the preloaded music was released
+            self.preload_next()
+            return
+
+        _, position = self.released_music
+        self.released_music = None
+        if self.get_data() != video_id or not self.media_player.source().isEmpty():
+            # another music plays by now
+            self.preload_next()
+            return
+
+        self.resume_position = position
+        self.media_player.setSource(QUrl.fromLocalFile(DOWNLOADS_DIRECTORY + video_id))
+
+    @property
+    def audio_output(self) -> QAudioOutput:
+        return self.media_player.audio_output()
+
+    def next_index(self) -> Optional[int]:
+        """
+        the music that plays after the current one ends, None if it's the
+        current one again or nothing
+        """
+        match self.playback_mode:
+            case PlaybackMode.LoopOnce:
+                return None
+            case PlaybackMode.Random:
+                self.sync_shuffle()
+                return self.shuffle.peek()
+
+        index = self.current_playing_index + 1
+        if index >= len(self.referencing_musics):
+            if self.playback_mode is PlaybackMode.Sequential:
+                return None
+            index = 0
+        return index
 
     def handle_error(self, error):
         if error is QMediaPlayer.Error.ResourceError:
@@ -581,7 +1706,7 @@ class Playlist(QTableWidget):
             QMessageBox.warning(
                 self.top_widget,
                 "Warning!",
-                f"""Song "{self.item(self.current_playing_index, 1).text()}" \
+                f"""Song "{self.text(self.current_playing_index)}" \
 does not exist! Check if you accidentally removed it""",
             )
             return
@@ -589,14 +1714,26 @@ does not exist! Check if you accidentally removed it""",
         logger.error("Error occurred: %s", error)
         self.media_player.play()
 
-    def generate_random_playlist(self):
-        self.random_playlist = list()
-        for index, url in enumerate(self.referencing_url["musics"]):
-            self.random_playlist.append((index, url["id"]))
+    def generate_random_playlist(self, weights: Optional[list[float]] = None):
+        """
+        reshuffles every row, musics with a higher weight tend to play earlier
+        """
+        self.shuffle.reset(
+            self.rowCount(), current=self.current_playing_index, weights=weights
+        )
 
-        random.shuffle(self.random_playlist)
+    def sync_shuffle(self):
+        if len(self.shuffle) != self.rowCount():
+            self.generate_random_playlist()
 
     def media_status_changed(self, status: QMediaPlayer.MediaStatus):
+        if (
+            status is QMediaPlayer.MediaStatus.LoadedMedia
+            and self.resume_position is not None
+        ):
+            self.media_player.setPosition(self.resume_position)
+            self.resume_position = None
+
         if status is not QMediaPlayer.MediaStatus.EndOfMedia:
             return
 
@@ -608,91 +1745,112 @@ does not exist! Check if you accidentally removed it""",
             case PlaybackMode.Sequential:
                 self.forward(False)
             case PlaybackMode.Random:
-                while True:
-                    # when the user uses this the first time, the self.random_playlist might not generate, so catch the error and then genereate a new one and
-                    # then start all over again
-                    # might be a little stupid but idk lol
-                    try:
-                        self.current_playing_index = self.random_playlist[0][0]
-                        self.media_player.setSource(
-                            QUrl.fromLocalFile(
-                                DOWNLOADS_DIRECTORY + self.random_playlist[0][1]
-                            )
-                        )
-                        self.random_playlist.pop(0)
-                        self.selectRow(self.current_playing_index)
-                    except Exception:
-                        self.generate_random_playlist()
-                        continue
-                    break
+                self.forward()
 
     @classmethod
     def set_playback_mode(cls, playback_mode: PlaybackMode):
         cls.playback_mode = playback_mode
 
-    def dropEvent(self, event: QDropEvent):
-        if not event.isAccepted() and event.source() == self:
-            drop_row = self.drop_on(event)
-
-            rows = sorted(set(item.row() for item in self.selectedItems()))
-            rows_to_move = [
-                [
-                    QTableWidgetItem(self.item(row_index, column_index))
-                    for column_index in range(self.columnCount())
-                ]
-                for row_index in rows
-            ]
-            for row_index in reversed(rows):
-                self.removeRow(row_index)
-                if row_index < drop_row:
-                    drop_row -= 1
-
-            for row_index, data in enumerate(rows_to_move):
-                row_index += drop_row
-                self.insertRow(row_index)
-                for column_index, column_data in enumerate(data):
-                    self.setItem(row_index, column_index, column_data)
-            event.accept()
-            for row_index in range(len(rows_to_move)):
-                self.item(drop_row + row_index, 0).setSelected(True)
-                self.item(drop_row + row_index, 1).setSelected(True)
-                self.item(drop_row + row_index, 2).setSelected(True)
+    def move_rows(self, source: int, count: int, destination: int):
+        """
+        moves count rows at source in front of destination, together with
+        everything that refers to them by row
+        """
+        if not self.playlist_model.moveRows(
+            QModelIndex(), source, count, QModelIndex(), destination
+        ):
+            return
 
-        logger.debug(f"selected rows: {rows}, drop row:{drop_row}")
+        move_items(self.referencing_musics, source, count, destination)
+        move_items(self.referencing_images, source, count, destination)
 
-        (self.referencing_images[drop_row], self.referencing_images[rows[0]],) = (
-            self.referencing_images[rows[0]],
-            self.referencing_images[drop_row],
-        )
+        if len(self.shuffle) == self.rowCount():
+            self.shuffle.move(source, count, destination)
+        if 0 <= self.current_playing_index < self.rowCount():
+            self.current_playing_index = moved_row(
+                self.current_playing_index, source, count, destination
+            )
 
-        (
-            self.referencing_url["musics"][drop_row],
-            self.referencing_url["musics"][rows[0]],
-        ) = (
-            self.referencing_url["musics"][rows[0]],
-            self.referencing_url["musics"][drop_row],
-        )
+        if self.is_downloads_playlist:
+            self.reindex_musics(
+                min(source, destination), max(source + count, destination)
+            )
 
-        # a little hack to call the resize event for this widget so that the images can be loaded
-        self.top_widget.resize(
-            self.top_widget.width() + 1, self.top_widget.height() + 1
+    def move_selection(self, rows: list[int], drop_row: int) -> tuple[int, int]:
+        """
+        moves the sorted rows in front of drop_row, keeping their order, and
+        returns the range they end up in
+        """
+        # every run of adjacent rows is moved at once, the runs above the drop
+        # row go from the bottom up and the runs below it from the top down, so
+        # the rows not moved yet keep their numbers
+        runs: list[list[int]] = list()
+        for row in rows:
+            if runs and runs[-1][0] + runs[-1][1] == row and row != drop_row:
+                runs[-1][1] += 1
+            else:
+                runs.append([row, 1])
+
+        top = drop_row
+        for source, count in reversed([run for run in runs if run[0] < drop_row]):
+            self.move_rows(source, count, top)
+            top -= count
+
+        bottom = drop_row
+        for source, count in (run for run in runs if run[0] >= drop_row):
+            self.move_rows(source, count, bottom)
+            bottom += count
+        return top, bottom
+
+    def dropEvent(self, event: QDropEvent):
+        if event.isAccepted() or event.source() != self:
+            return
+
+        drop_row = self.drop_on(event)
+        rows = sorted(
+            self.filter_model.mapToSource(index).row()
+            for index in self.selectionModel().selectedRows()
         )
-        self.top_widget.resize(
-            self.top_widget.width() - 1, self.top_widget.height() - 1
+
+        # copy action, so the view won't try to remove the dragged rows afterwards
+        event.setDropAction(Qt.DropAction.CopyAction)
+        event.accept()
+
+        logger.debug(f"selected rows: {rows}, drop row:{drop_row}")
+        if rows:
+            self.drop_rows(rows, drop_row)
+
+    def drop_rows(self, rows: list[int], drop_row: int):
+        """
+        moves the sorted rows in front of drop_row, selects them and saves the
+        new order
+        """
+        top, bottom = self.move_selection(rows, drop_row)
+
+        # the rows moved were all shown, so they're next to each other in the view too
+        self.selectionModel().select(
+            QtCore.QItemSelection(
+                self.view_index(top),
+                self.view_index(bottom - 1, self.playlist_model.columnCount() - 1),
+            ),
+            QtCore.QItemSelectionModel.SelectionFlag.ClearAndSelect,
         )
 
-        super().dropEvent(event)
+        if self.is_downloads_playlist:
+            start, end = min(rows[0], drop_row), max(rows[-1] + 1, drop_row)
+            self.library.set_order(
+                [music["id"] for music in self.musics[start:end]], start
+            )
+        else:
+            self.save_current_playlist()
 
     def drop_on(self, event: QDropEvent):
         index = self.indexAt(event.position().toPoint())
         if not index.isValid():
             return self.rowCount()
 
-        return (
-            index.row() + 1
-            if self.is_below(event.position().toPoint(), index)
-            else index.row()
-        )
+        row = self.filter_model.mapToSource(index).row()
+        return row + 1 if self.is_below(event.position().toPoint(), index) else row
 
     def is_below(self, pos, index):
         rect = self.visualRect(index)
@@ -711,25 +1869,24 @@ does not exist! Check if you accidentally removed it""",
             and pos.y() >= rect.center().y()
         )
 
-    def save_downloads_playlist(self):
-        with open(PLAYLIST_DIRECTORY + "downloads.json", mode="w") as file:
-            file.write(json.dumps({"musics": self.urls["musics"]}, indent=2))
-
     def add_music(self):
         current_index = self.download_musics_listwidget.currentRow()
-        music = self.urls["musics"][current_index]
+        music = self.musics[current_index]
 
-        self.referencing_url["musics"].append({**music, "index": current_index})
+        self.referencing_musics.append(dict(music))
         self.referencing_images.append(self.images[current_index])
-        self.push_item(self.images[current_index], music["title"], music["author"])
+        self.push_item(
+            self.images[current_index], music["title"], music["author"], music["id"]
+        )
+        self.save_current_playlist()
 
         QMessageBox.information(
             self.download_musics_dialog,
             "Added!",
-            f"Added {self.urls['musics'][current_index]['title']} successfully to current playlist!",
+            f"Added {self.musics[current_index]['title']} successfully to current playlist!",
         )
 
-    def dataChanged(
+    def item_edited(
         self,
         top_left: QtCore.QModelIndex,
         bottom_right: QtCore.QModelIndex,
@@ -738,15 +1895,14 @@ does not exist! Check if you accidentally removed it""",
         if len(roles) == 0 or len(roles) == 1:
             return
 
-        item = self.currentItem()
-        column, row = self.currentIndex().column(), self.currentIndex().row()
-        logger.debug(item.text())
+        column, row = top_left.column(), top_left.row()
+        logger.debug(top_left.data())
 
         match column:
             case 1:
-                self.referencing_url["musics"][row]["title"] = item.text()
+                self.set_data(top_left.data(), "title", row)
             case 2:
-                self.referencing_url["musics"][row]["author"] = item.text()
+                self.set_data(top_left.data(), "author", row)
 
 
 class PlaylistsHandler(QListWidget):
@@ -775,6 +1931,9 @@ class PlaylistsHandler(QListWidget):
             lambda: (self.add_playlist_widget.hide(), self.reset_widget())
         )
 
+        # the item of the playlist that is shown, it's drawn grayed out
+        self.highlighted_item: Optional[QListWidgetItem] = None
+
         self.itemClicked.connect(self.item_changed)
 
         self.top_widget = self.parent()
@@ -793,25 +1952,24 @@ class PlaylistsHandler(QListWidget):
         self.add_playlist_widget.setWindowTitle(self.DEFAULT_TITLE)
 
     def load_playlists(self):
-        for filename in os.listdir(PLAYLIST_DIRECTORY):
-            if filename == "downloads.json":
-                continue
-
-            if filename.endswith(".json"):
-                filename = filename[: -len(".json")]
-
-            self.playlists.append(filename)
-            self.addItem(self.generate_item(filename))
+        for playlist_name in Playlist.library.playlists():
+            self.playlists.append(playlist_name)
+            self.addItem(self.generate_item(playlist_name))
 
     def add_playlist(self):
+        try:
+            Playlist.library.add_playlist(self.ui.playlist_name.text())
+        except Exception as error:
+            QMessageBox.warning(
+                self,
+                "Failed to add playlist!",
+                f'Failed to add "{self.ui.playlist_name.text()}"! Error: {error}',
+            )
+            return
+
         self.addItem(self.generate_item(self.ui.playlist_name.text()))
         self.playlists.append(self.ui.playlist_name.text())
 
-        with open(
-            f"{PLAYLIST_DIRECTORY}{self.ui.playlist_name.text()}.json", mode="w"
-        ) as file:
-            file.write(json.dumps({"musics": []}, indent=2))
-
         self.add_playlist_widget.hide()
         self.reset_widget()
 
@@ -824,7 +1982,7 @@ class PlaylistsHandler(QListWidget):
         item = self.currentItem()
 
         try:
-            os.remove(f"{PLAYLIST_DIRECTORY}{item.text()}.json")
+            Playlist.library.remove_playlist(item.text())
         except Exception as error:
             QMessageBox.warning(
                 self,
@@ -851,9 +2009,15 @@ class PlaylistsHandler(QListWidget):
         text = self.ui.playlist_name.text()
         old_name = self.currentItem().text()
 
-        os.rename(
-            PLAYLIST_DIRECTORY + old_name + ".json", PLAYLIST_DIRECTORY + text + ".json"
-        )
+        try:
+            Playlist.library.rename_playlist(old_name, text)
+        except Exception as error:
+            QMessageBox.warning(
+                self,
+                "Failed to edit playlist!",
+                f'Failed to rename "{old_name}"! Error: {error}',
+            )
+            return
 
         self.currentItem().setText(text)
 
@@ -892,17 +2056,14 @@ class PlaylistsHandler(QListWidget):
         menu.exec(self.mapToGlobal(pos))
 
     def item_changed(self, item: QListWidgetItem):
-        for row in range(self.count()):
-            current_item = self.item(row)
-            if current_item.foreground().color() == QColor(115, 115, 115):
-                current_item.setForeground(QColor(0, 0, 0))
-                break
+        if self.highlighted_item is not None:
+            self.highlighted_item.setForeground(QColor(0, 0, 0))
 
         item.setForeground(qRgb(115, 115, 115))
+        self.highlighted_item = item
 
     def deselect(self):
         self.setCurrentRow(-1)
-        for row in range(self.count()):
-            item = self.item(row)
-            if item.foreground().color() == QColor(115, 115, 115):
-                item.setForeground(QColor(0, 0, 0))
+        if self.highlighted_item is not None:
+            self.highlighted_item.setForeground(QColor(0, 0, 0))
+            self.highlighted_item = None
@@ -0,0 +1,607 @@
+import hashlib
+import http.client
+import http.server
+import json
+import logging
+import os
+import re
+import threading
+import time
+import urllib.error
+import urllib.request as urlreq
+import coloredlogs
+import pytube
+import youtubesearchpython as ytsearch
+
+from typing import Optional, Union
+from PyQt6.QtCore import QMutex
+from app_settings import (
+    DOWNLOAD_BLOCK_SIZE,
+    FORMAT,
+    LOGGING_LEVEL,
+    NETWORK_FIXTURE_FOLDER,
+    NETWORK_MODE,
+    REPLAY_BANDWIDTH,
+    REPLAY_LATENCY,
+    REPLAY_SERVER,
+)
+
+coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
+logger = logging.getLogger(__name__)
+
+RANGE_PATTERN = re.compile(r"bytes=(\d+)-(\d*)")
+# headers that describe a single response rather than the resource
+RESPONSE_HEADERS = {
+    "connection",
+    "content-length",
+    "content-range",
+    "date",
+    "transfer-encoding",
+}
+
+RequestType = Union[urlreq.Request, str]
+
+
+def message(headers: dict) -> http.client.HTTPMessage:
+    """
+    headers as the case insensitive mapping urllib hands out
+    """
+    headers_message = http.client.HTTPMessage()
+    for name, value in headers.items():
+        headers_message[name] = value
+    return headers_message
+
+
+class AudioStream:
+    def __init__(self, url: str, filesize: int, itag: Optional[int] = None) -> None:
+        self.url = url
+        self.filesize = filesize
+        self.itag = itag
+
+
+class Video:
+    """
+    what the app uses of a youtube video, the attributes have the names of
+    the pytube.YouTube ones
+    """
+
+    def __init__(
+        self,
+        video_id: str,
+        title: str,
+        author: str,
+        length: Optional[int],
+        thumbnail_url: str,
+        audio: Optional[AudioStream] = None,
+    ) -> None:
+        self.video_id = video_id
+        self.title = title
+        self.author = author
+        self.length = length
+        self.thumbnail_url = thumbnail_url
+        self.audio = audio
+
+    def audio_stream(self) -> AudioStream:
+        if self.audio is None:
+            raise LookupError(f"No audio stream of {self.video_id} was recorded")
+        return self.audio
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.video_id,
+            "title": self.title,
+            "author": self.author,
+            "length": self.length,
+            "thumbnail_url": self.thumbnail_url,
+            "audio": self.audio and vars(self.audio),
+        }
+
+    @classmethod
+    def from_json(cls, json_data: dict) -> "Video":
+        audio = json_data.get("audio")
+        return cls(
+            json_data["id"],
+            json_data["title"],
+            json_data["author"],
+            json_data.get("length"),
+            json_data["thumbnail_url"],
+            (
+                AudioStream(audio["url"], audio["filesize"], audio.get("itag"))
+                if audio
+                else None
+            ),
+        )
+
+
+class YouTubeVideo(Video):
+    def __init__(self, link: str) -> None:
+        self.youtube = pytube.YouTube(link)
+        super().__init__(
+            self.youtube.video_id,
+            self.youtube.title,
+            self.youtube.author,
+            self.youtube.length,
+            self.youtube.thumbnail_url,
+        )
+
+    def audio_stream(self) -> AudioStream:
+        if self.audio is None:
+            stream = self.youtube.streams.get_audio_only()
+            self.audio = AudioStream(stream.url, stream.filesize, stream.itag)
+        return self.audio
+
+
+class LiveProvider:
+    """
+    goes to youtube and the network directly
+
+    a provider has search, which returns something with the result and next
+    methods of ytsearch.VideosSearch, video, which returns a Video, and urlopen,
+    which behaves like urllib.request.urlopen
+    """
+
+    def search(self, query: str, limit: int, timeout: int = 10):
+        return ytsearch.VideosSearch(query, limit=limit, timeout=timeout)
+
+    def video(self, link: str) -> Video:
+        return YouTubeVideo(link)
+
+    def urlopen(self, request: RequestType, timeout: Optional[float] = None):
+        return urlreq.urlopen(request, timeout=timeout)
+
+
+class Fixtures:
+    """
+    the recorded network traffic, stored under folder as
+
+        searches/<hash>.json    the pages of a search, in order
+        videos/<video id>.json  the metadata and the audio stream of a video
+        responses/<hash>.json   the status and headers of a url
+        responses/<hash>.body   its body, put together from every range fetched
+
+    everything is keyed by sha256 of the query or the url, so the files of a
+    recording can be copied between machines
+    """
+
+    def __init__(self, folder: str = NETWORK_FIXTURE_FOLDER) -> None:
+        self.folder = folder
+        self.mutex = QMutex()
+
+        for subfolder in ("searches", "videos", "responses"):
+            os.makedirs(os.path.join(folder, subfolder), exist_ok=True)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    @classmethod
+    def search_key(cls, query: str, limit: int) -> str:
+        return cls.key(f"{limit}:{' '.join(query.casefold().split())}")
+
+    def path(self, subfolder: str, name: str) -> str:
+        return os.path.join(self.folder, subfolder, name)
+
+    def read_json(self, path: str) -> Optional[dict]:
+        if not os.path.exists(path):
+            return None
+        with open(path) as file:
+            return json.loads(file.read())
+
+    def write_json(self, path: str, json_data):
+        temporary_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary_path, "w") as file:
+            file.write(json.dumps(json_data, indent=2))
+        os.replace(temporary_path, path)
+
+    def read_search(self, query: str, limit: int) -> Optional[list[dict]]:
+        return self.read_json(
+            self.path("searches", f"{self.search_key(query, limit)}.json")
+        )
+
+    def save_search(self, query: str, limit: int, pages: list[dict]):
+        path = self.path("searches", f"{self.search_key(query, limit)}.json")
+
+        self.mutex.lock()
+        # a shorter recording of the same search keeps the pages after it
+        recorded = self.read_json(path) or list()
+        self.write_json(path, pages + recorded[len(pages) :])
+        self.mutex.unlock()
+
+    def read_video(self, video_id: str) -> Optional[Video]:
+        json_data = self.read_json(self.path("videos", f"{video_id}.json"))
+        return json_data and Video.from_json(json_data)
+
+    def save_video(self, video: Video):
+        path = self.path("videos", f"{video.video_id}.json")
+
+        self.mutex.lock()
+        json_data = video.to_json()
+        if json_data["audio"] is None:
+            # looking up the metadata again doesn't forget the stream
+            json_data["audio"] = (self.read_json(path) or dict()).get("audio")
+        self.write_json(path, json_data)
+        self.mutex.unlock()
+
+    def save_response(self, url: str, headers: http.client.HTTPMessage, size: int):
+        headers = {
+            name: value
+            for name, value in headers.items()
+            if name.lower() not in RESPONSE_HEADERS
+        }
+        self.write_json(
+            self.path("responses", f"{self.key(url)}.json"),
+            {"url": url, "headers": headers, "size": size},
+        )
+
+    def write_body(self, url: str, offset: int, data: bytes):
+        path = self.path("responses", f"{self.key(url)}.body")
+
+        self.mutex.lock()
+        with open(path, "r+b" if os.path.exists(path) else "wb") as file:
+            file.seek(offset)
+            file.write(data)
+        self.mutex.unlock()
+
+    def resolve(
+        self, key: str, request_headers: http.client.HTTPMessage
+    ) -> tuple[int, dict, int, int]:
+        """
+        returns the status, headers, offset and length of the reply to a
+        request for the url with key, honoring ranges and revalidation
+        """
+        meta = self.read_json(self.path("responses", f"{key}.json"))
+        body_path = self.path("responses", f"{key}.body")
+        if meta is None:
+            raise LookupError(f"No response for {key} was recorded")
+        size = meta["size"]
+        if not os.path.exists(body_path) or os.path.getsize(body_path) < size:
+            raise LookupError(f"The response for {meta['url']} is incomplete")
+
+        headers = dict(meta["headers"])
+        recorded = message(headers)
+        etag = recorded.get("ETag")
+        last_modified = recorded.get("Last-Modified")
+        if (etag and request_headers.get("If-None-Match") == etag) or (
+            last_modified and request_headers.get("If-Modified-Since") == last_modified
+        ):
+            return 304, headers, 0, 0
+
+        status, offset, length = 200, 0, size
+        match = RANGE_PATTERN.fullmatch(request_headers.get("Range") or "")
+        if match:
+            offset = int(match.group(1))
+            if offset >= size:
+                headers["Content-Range"] = f"bytes */{size}"
+                return 416, headers, 0, 0
+            end = min(int(match.group(2) or size - 1), size - 1)
+            status, length = 206, end - offset + 1
+            headers["Content-Range"] = f"bytes {offset}-{end}/{size}"
+
+        headers["Content-Length"] = str(length)
+        return status, headers, offset, length
+
+    def open_body(self, key: str, offset: int, length: int, bandwidth: int):
+        return ReplayBody(
+            self.path("responses", f"{key}.body"), offset, length, bandwidth
+        )
+
+
+class RecordingSearch:
+    def __init__(self, search, fixtures: Fixtures, query: str, limit: int) -> None:
+        self.search = search
+        self.fixtures = fixtures
+        self.query = query
+        self.limit = limit
+
+        self.pages: list[dict] = list()
+        self.page = 0
+
+    def result(self) -> dict:
+        result = self.search.result()
+        if self.page == len(self.pages):
+            self.pages.append(result)
+            self.fixtures.save_search(self.query, self.limit, self.pages)
+        return result
+
+    def next(self) -> bool:
+        if not self.search.next():
+            return False
+        self.page += 1
+        return True
+
+
+class RecordingVideo(Video):
+    def __init__(self, video: Video, fixtures: Fixtures) -> None:
+        super().__init__(
+            video.video_id,
+            video.title,
+            video.author,
+            video.length,
+            video.thumbnail_url,
+        )
+        self.video = video
+        self.fixtures = fixtures
+
+    def audio_stream(self) -> AudioStream:
+        self.audio = self.video.audio_stream()
+        self.fixtures.save_video(self)
+        return self.audio
+
+
+class RecordingResponse:
+    """
+    passes the response through, writing every block read into the body of
+    the url at the offset it came from
+    """
+
+    def __init__(self, response, fixtures: Fixtures, url: str) -> None:
+        self.response = response
+        self.fixtures = fixtures
+        self.url = url
+
+        self.status = response.status
+        self.headers = response.headers
+
+        self.offset = 0
+        size = response.headers.get("Content-Length")
+        content_range = response.headers.get("Content-Range")
+        if content_range:
+            # bytes <start>-<end>/<size>
+            range_text, size = content_range.split(" ")[-1].split("/")
+            self.offset = int(range_text.split("-")[0])
+        if size is not None and size != "*":
+            fixtures.save_response(url, response.headers, int(size))
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.response.read(size)
+        if data:
+            self.fixtures.write_body(self.url, self.offset, data)
+            self.offset += len(data)
+        return data
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self) -> "RecordingResponse":
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+class RecordingProvider:
+    """
+    goes to the network through provider, and records everything that comes
+    back into fixtures
+    """
+
+    def __init__(self, fixtures: Fixtures, provider: Optional[LiveProvider] = None):
+        self.fixtures = fixtures
+        self.provider = provider or LiveProvider()
+
+    def search(self, query: str, limit: int, timeout: int = 10):
+        return RecordingSearch(
+            self.provider.search(query, limit, timeout), self.fixtures, query, limit
+        )
+
+    def video(self, link: str) -> Video:
+        video = RecordingVideo(self.provider.video(link), self.fixtures)
+        self.fixtures.save_video(video)
+        return video
+
+    def urlopen(self, request: RequestType, timeout: Optional[float] = None):
+        url = request if isinstance(request, str) else request.full_url
+        # a 304 raises, the body recorded before it stays the answer
+        response = self.provider.urlopen(request, timeout)
+        return RecordingResponse(response, self.fixtures, url)
+
+
+class ReplayBody:
+    """
+    length bytes of the file from offset, read no faster than bandwidth bytes
+    per second, 0 for no limit
+    """
+
+    def __init__(self, path: str, offset: int, length: int, bandwidth: int) -> None:
+        self.file = open(path, "rb")
+        self.file.seek(offset)
+        self.remaining = length
+        self.bandwidth = bandwidth
+
+        self.start = time.monotonic()
+        self.sent = 0
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        self.sent += len(data)
+
+        if self.bandwidth:
+            delay = self.sent / self.bandwidth - (time.monotonic() - self.start)
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayResponse:
+    def __init__(self, url: str, status: int, headers: dict, body: ReplayBody):
+        self.url = url
+        self.status = status
+        self.headers = message(headers)
+        self.body = body
+
+    def getcode(self) -> int:
+        return self.status
+
+    def read(self, size: int = -1) -> bytes:
+        return self.body.read(size)
+
+    def close(self):
+        self.body.close()
+
+    def __enter__(self) -> "ReplayResponse":
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+
+class ReplaySearch:
+    def __init__(self, pages: list[dict], latency: float) -> None:
+        self.pages = pages
+        self.latency = latency
+        self.page = 0
+
+    def result(self) -> dict:
+        return self.pages[self.page]
+
+    def next(self) -> bool:
+        time.sleep(self.latency)
+        if self.page + 1 >= len(self.pages):
+            return False
+        self.page += 1
+        return True
+
+
+class ReplayRequestHandler(http.server.BaseHTTPRequestHandler):
+    server: "ReplayHTTPServer"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency)
+
+        key = self.path.strip("/")
+        try:
+            status, headers, offset, length = server.fixtures.resolve(key, self.headers)
+        except LookupError as error:
+            self.send_error(404, str(error))
+            return
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if status >= 300:
+            self.send_header("Content-Length", "0")
+        self.end_headers()
+        if status >= 300:
+            return
+
+        body = server.fixtures.open_body(key, offset, length, server.bandwidth)
+        try:
+            while block := body.read(DOWNLOAD_BLOCK_SIZE):
+                self.wfile.write(block)
+        except ConnectionError:
+            # the client gave up, like a superseded thumbnail load does
+            pass
+        finally:
+            body.close()
+
+    def log_message(self, format: str, *args):
+        logger.debug(format, *args)
+
+
+class ReplayHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, fixtures: Fixtures, latency: float, bandwidth: int) -> None:
+        super().__init__(("127.0.0.1", 0), ReplayRequestHandler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+    def url(self, key: str) -> str:
+        return f"http://127.0.0.1:{self.server_port}/{key}"
+
+
+class ReplayProvider:
+    """
+    answers from fixtures only, never from the network
+
+    every answer is delayed by latency seconds and the bodies are read at
+    bandwidth bytes per second, with server the bodies are served by a local
+    http server, so the replay goes through sockets and urllib as well
+    """
+
+    def __init__(
+        self,
+        fixtures: Fixtures,
+        latency: float = REPLAY_LATENCY,
+        bandwidth: int = REPLAY_BANDWIDTH,
+        server: bool = REPLAY_SERVER,
+    ) -> None:
+        self.fixtures = fixtures
+        self.latency = latency
+        self.bandwidth = bandwidth
+
+        self.server: Optional[ReplayHTTPServer] = None
+        if server:
+            self.server = ReplayHTTPServer(fixtures, latency, bandwidth)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            logger.info("Replaying from %s", self.server.url(""))
+
+    def search(self, query: str, limit: int, timeout: int = 10) -> ReplaySearch:
+        time.sleep(self.latency)
+        pages = self.fixtures.read_search(query, limit)
+        if not pages:
+            raise LookupError(f'The search "{query}" was not recorded')
+        return ReplaySearch(pages, self.latency)
+
+    def video(self, link: str) -> Video:
+        time.sleep(self.latency)
+        video = self.fixtures.read_video(pytube.extract.video_id(link))
+        if video is None:
+            raise LookupError(f"{link} was not recorded")
+        return video
+
+    def urlopen(self, request: RequestType, timeout: Optional[float] = None):
+        if isinstance(request, str):
+            request = urlreq.Request(request)
+        key = Fixtures.key(request.full_url)
+
+        if self.server is not None:
+            return urlreq.urlopen(
+                urlreq.Request(
+                    self.server.url(key), headers=dict(request.header_items())
+                ),
+                timeout=timeout,
+            )
+
+        time.sleep(self.latency)
+        status, headers, offset, length = self.fixtures.resolve(
+            key, message(dict(request.header_items()))
+        )
+        if status >= 300:
+            raise urllib.error.HTTPError(
+                request.full_url,
+                status,
+                http.client.responses[status],
+                message(headers),
+                None,
+            )
+        body = self.fixtures.open_body(key, offset, length, self.bandwidth)
+        return ReplayResponse(request.full_url, status, headers, body)
+
+    def shutdown(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def create_provider(mode: str = NETWORK_MODE):
+    if mode == "live":
+        return LiveProvider()
+    if mode == "record":
+        return RecordingProvider(Fixtures())
+    if mode == "replay":
+        return ReplayProvider(Fixtures())
+    raise ValueError(f"Unknown network mode {mode}")
+
+
+# every search, thumbnail and download goes through it, so it can be swapped
+# for a recording or a replay
+provider = create_provider()
@@ -0,0 +1,198 @@
+import bisect
+import re
+import unicodedata
+
+from collections import Counter
+from typing import Optional
+from PyQt6.QtCore import QMutex
+from app_settings import LOCAL_SEARCH_FUZZY_LENGTH, LOCAL_SEARCH_SIMILARITY
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def normalize(text: str) -> str:
+    """
+    casefolded and without accents, so "Beyoncé" is found by "beyonce"
+    """
+    text = text.casefold()
+    if text.isascii():
+        return text
+
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def trigrams(token: str) -> set[str]:
+    padded = f"${token}$"
+    return {padded[index : index + 3] for index in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    inverted index over the titles, authors and ids of the library
+
+    every word of a query has to match a word of the music, either exactly,
+    as a prefix, or through the trigrams it shares with it, so typos still
+    find the music
+
+    the words are kept sorted for the prefixes and mapped from their trigrams
+    for the typos, so a search only looks at the words that can match and the
+    musics containing them, never at the whole library
+    """
+
+    def __init__(self) -> None:
+        self.mutex = QMutex()
+
+        # word -> ids of the musics containing it
+        self.postings: dict[str, set[str]] = dict()
+        # video id -> its words
+        self.documents: dict[str, set[str]] = dict()
+        # trigram -> words containing it
+        self.trigram_words: dict[str, set[str]] = dict()
+
+        # every word, sorted, the words added since the last search are only
+        # sorted in when the next search needs them
+        self.vocabulary: list[str] = list()
+        self.unsorted_words: set[str] = set()
+
+    def add(self, video_id: str, title: str, author: str):
+        """
+        indexes the music, replacing what was indexed for it before
+        """
+        words = set(tokenize(f"{title} {author}"))
+        # the id is matched whole or by its prefix, typos in it aren't looked for
+        id_word = normalize(video_id)
+
+        self.mutex.lock()
+        self.remove_document(video_id)
+
+        for word in words:
+            if word not in self.postings:
+                self.postings[word] = set()
+                self.unsorted_words.add(word)
+                for trigram in trigrams(word):
+                    self.trigram_words.setdefault(trigram, set()).add(word)
+            self.postings[word].add(video_id)
+
+        if id_word not in self.postings:
+            self.postings[id_word] = set()
+            self.unsorted_words.add(id_word)
+        self.postings[id_word].add(video_id)
+
+        words.add(id_word)
+        self.documents[video_id] = words
+        self.mutex.unlock()
+
+    def remove(self, video_id: str):
+        self.mutex.lock()
+        self.remove_document(video_id)
+        self.mutex.unlock()
+
+    def remove_document(self, video_id: str):
+        """
+        the mutex must be held by the caller
+        """
+        for word in self.documents.pop(video_id, ()):
+            ids = self.postings[word]
+            ids.discard(video_id)
+            if ids:
+                continue
+
+            del self.postings[word]
+            for trigram in trigrams(word):
+                # ids have no trigrams
+                words = self.trigram_words.get(trigram)
+                if words is None:
+                    continue
+                words.discard(word)
+                if not words:
+                    del self.trigram_words[trigram]
+
+            if word in self.unsorted_words:
+                self.unsorted_words.discard(word)
+            else:
+                del self.vocabulary[bisect.bisect_left(self.vocabulary, word)]
+
+    def sort_vocabulary(self):
+        """
+        the mutex must be held by the caller
+        """
+        if len(self.unsorted_words) > 64:
+            self.vocabulary = sorted(self.postings)
+        else:
+            for word in self.unsorted_words:
+                bisect.insort(self.vocabulary, word)
+        self.unsorted_words.clear()
+
+    def matching_words(self, term: str) -> set[str]:
+        """
+        the mutex must be held by the caller
+        """
+        # the words starting with term sit right before the first word that
+        # would come after all of them
+        start = bisect.bisect_left(self.vocabulary, term)
+        end = bisect.bisect_left(
+            self.vocabulary, term[:-1] + chr(min(ord(term[-1]) + 1, 0x10FFFF)), start
+        )
+        words = set(self.vocabulary[start:end])
+
+        if len(term) < LOCAL_SEARCH_FUZZY_LENGTH:
+            return words
+
+        # dice coefficient of the trigrams, counted only over the words
+        # sharing at least one trigram with the term
+        term_trigrams = trigrams(term)
+        shared = Counter()
+        for trigram in term_trigrams:
+            shared.update(self.trigram_words.get(trigram, ()))
+
+        for word, count in shared.items():
+            similarity = 2 * count / (len(term_trigrams) + len(word))
+            if similarity >= LOCAL_SEARCH_SIMILARITY:
+                words.add(word)
+        return words
+
+    def search(self, query: str) -> Optional[set[str]]:
+        """
+        returns the ids of the musics matching every word of query, None if
+        query has no words at all
+        """
+        terms = set(tokenize(query))
+        if not terms:
+            return None
+
+        self.mutex.lock()
+        if self.unsorted_words:
+            self.sort_vocabulary()
+
+        matches = list()
+        for term in terms:
+            words = self.matching_words(term)
+            size = sum(map(len, map(self.postings.__getitem__, words)))
+            matches.append((size, words))
+        # the rarest term first, the others only have to narrow its musics down
+        matches.sort(key=lambda match: match[0])
+
+        result: Optional[set[str]] = None
+        for size, words in matches:
+            if result is None:
+                result = set().union(*map(self.postings.__getitem__, words))
+            elif len(result) * 4 < size:
+                # checking the few musics left is cheaper than merging the sets
+                result = {
+                    video_id
+                    for video_id in result
+                    if not self.documents[video_id].isdisjoint(words)
+                }
+            else:
+                result &= set().union(*map(self.postings.__getitem__, words))
+
+            if not result:
+                break
+        self.mutex.unlock()
+
+        return result
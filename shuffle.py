@@ -0,0 +1,185 @@
+import random
+
+from typing import Optional, Sequence
+
+
+def moved_row(row: int, source: int, count: int, destination: int) -> int:
+    """
+    where row ends up after count rows at source moved in front of destination,
+    destination counted before the move
+    """
+    if source <= row < source + count:
+        if destination > source:
+            return row - source + destination - count
+        return row - source + destination
+    if destination <= row < source:
+        return row + count
+    if source + count <= row < destination:
+        return row - count
+    return row
+
+
+class ShuffleQueue:
+    """
+    shuffled order of the rows of a playlist
+
+    order is a permutation of the rows, everything up to position has been
+    played, and location maps every row back to its place in order, so moving
+    forward, moving back and jumping to a row are all O(1)
+
+    rows can be inserted and removed while shuffling without reshuffling, the
+    rows after them are renumbered in a single pass
+    """
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.order: list[int] = list()
+        self.location: list[int] = list()
+        self.position = -1
+
+        self.random = random.Random(seed)
+        self.weights: Optional[Sequence[float]] = None
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def reset(
+        self,
+        size: int,
+        current: int = -1,
+        seed: Optional[int] = None,
+        weights: Optional[Sequence[float]] = None,
+    ):
+        """
+        shuffles size rows, with current as the one already playing
+
+        rows with a higher weight tend to come earlier, a weight of 0 puts the
+        row at the end
+        """
+        if seed is not None:
+            self.random.seed(seed)
+        self.weights = weights
+
+        self.order = list(range(size))
+        self.shuffle()
+        self.location = [0] * size
+        for place, row in enumerate(self.order):
+            self.location[row] = place
+
+        self.position = -1
+        if 0 <= current < size:
+            self.swap(0, self.location[current])
+            self.position = 0
+
+    def shuffle(self):
+        if self.weights is None:
+            self.random.shuffle(self.order)
+            return
+
+        # weighted sampling without replacement (Efraimidis-Spirakis),
+        # every row gets the key u ** (1 / weight) and the highest keys go first
+        def key(row: int) -> float:
+            weight = self.weights[row] if row < len(self.weights) else 1.0
+            if weight <= 0:
+                return 0.0
+            return self.random.random() ** (1 / weight)
+
+        keys = {row: key(row) for row in self.order}
+        self.order.sort(key=keys.__getitem__, reverse=True)
+
+    def swap(self, first: int, second: int):
+        self.order[first], self.order[second] = self.order[second], self.order[first]
+        self.location[self.order[first]] = first
+        self.location[self.order[second]] = second
+
+    def peek(self) -> Optional[int]:
+        """
+        the row that advance returns next, None if a new round starts then
+        """
+        if self.position + 1 < len(self.order):
+            return self.order[self.position + 1]
+        return None
+
+    def advance(self) -> Optional[int]:
+        if not self.order:
+            return None
+
+        if self.position + 1 >= len(self.order):
+            # every row has been played, start a new round
+            last = self.order[self.position]
+            self.shuffle()
+            for place, row in enumerate(self.order):
+                self.location[row] = place
+            # never the same row twice in a row
+            if len(self.order) > 1 and self.order[0] == last:
+                self.swap(0, self.random.randrange(1, len(self.order)))
+            self.position = -1
+
+        self.position += 1
+        return self.order[self.position]
+
+    def back(self) -> Optional[int]:
+        if self.position <= 0:
+            return None
+
+        self.position -= 1
+        return self.order[self.position]
+
+    def jump(self, row: int):
+        """
+        makes row the current one, it's taken out of the rows still to come
+        """
+        place = self.location[row]
+        if place > self.position:
+            self.swap(self.position + 1, place)
+            self.position += 1
+        else:
+            self.position = place
+
+    def insert(self, row: int):
+        """
+        a new row at row, it's placed somewhere among the rows still to come
+        """
+        if row != len(self.order):
+            self.order = [other + 1 if other >= row else other for other in self.order]
+            self.location.insert(row, 0)
+
+        self.order.append(row)
+        if row == len(self.location):
+            self.location.append(0)
+        self.location[row] = len(self.order) - 1
+
+        self.swap(
+            len(self.order) - 1,
+            self.random.randrange(self.position + 1, len(self.order)),
+        )
+
+    def move(self, source: int, count: int, destination: int):
+        """
+        renumbers the rows after count rows at source moved in front of
+        destination, only the rows in between change
+        """
+        low, high = min(source, destination), max(source + count, destination)
+        places = self.location[low:high]
+        for place in places:
+            self.order[place] = moved_row(self.order[place], source, count, destination)
+        for place in places:
+            self.location[self.order[place]] = place
+
+    def remove(self, row: int):
+        place = self.location[row]
+
+        if place > self.position:
+            # still to come, the order of those is random anyway
+            self.swap(place, len(self.order) - 1)
+            self.order.pop()
+        else:
+            # already played, the history keeps its order
+            del self.order[place]
+            self.position -= 1
+            for later in range(place, len(self.order)):
+                self.location[self.order[later]] = later
+
+        # the places of the rows after it stay the same, only their numbers shift
+        del self.location[row]
+        if row != len(self.location):
+            self.order = [other - 1 if other > row else other for other in self.order]
@@ -2,132 +2,935 @@ import logging
 import os
 import coloredlogs
 import pytube
-import youtubesearchpython as ytsearch
 import urllib.request as urlreq
 import json
+import enum
+import multiprocessing
+import shutil
+import time
+import loudness
+import network
 
-from PyQt6.QtCore import QMutex, QObject, QSize, QThread, Qt
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from functools import partial
+from typing import Optional
+from urllib.parse import urlparse
+
+from PyQt6.QtCore import QMutex, QObject, QSize, QThread, QTimer
 from PyQt6 import QtCore
 from app_settings import (
     DOWNLOAD_AUDIO_TO,
+    DOWNLOAD_BLOCK_SIZE,
+    DOWNLOAD_CHUNK_SIZE,
+    DOWNLOAD_JOURNAL_FILE,
+    DOWNLOAD_JOURNAL_INTERVAL,
+    DOWNLOAD_MAX_ATTEMPTS,
+    DOWNLOAD_PROGRESS_INTERVAL,
+    DOWNLOAD_TIMEOUT,
+    DOWNLOAD_WORKERS,
+    DOWNLOADS_PER_HOST,
     DOWNLOADS_PLAYLIST,
     FORMAT,
     LOGGING_LEVEL,
-    PLAYLIST_DIRECTORY,
+    LOUDNESS_MAX_GAIN,
+    LOUDNESS_MAX_TRUE_PEAK,
+    LOUDNESS_TARGET,
+    LOUDNESS_WORKERS,
+    METADATA_WORKERS,
+    SEARCH_DEBOUNCE_MS,
     SEARCH_LIMIT,
+    SEARCH_POLL_INTERVAL,
+    SEARCH_WORKERS,
     SETTINGS_FILE,
     THUMBNAIL_FOLDER,
+    THUMBNAIL_TIMEOUT,
+    THUMBNAIL_WORKERS,
 )
-from PyQt6.QtGui import QPixmap
+from PyQt6.QtGui import QImage
 
-from my_widget import PlaybackMode, Playlist
+from disk_cache import SearchResultCache, ThumbnailDiskCache
+from my_widget import PlaybackMode, Playlist, ThumbnailCache
 
 coloredlogs.install(fmt=FORMAT, level=LOGGING_LEVEL)
 logger = logging.getLogger(__name__)
 
 
 class SearchVideo(QObject):
+    """
+    lives on the search thread for the whole session, searches and page
+    requests are queued to it and handled in order
+
+    every request carries the generation of the search it belongs to, requests
+    of older generations are skipped and their network calls abandoned
+    """
+
     done = QtCore.pyqtSignal()
-    error_occurred = QtCore.pyqtSignal(Exception)
-    result_ready = QtCore.pyqtSignal(dict)
+    # every signal starts with the generation it belongs to
+    error_occurred = QtCore.pyqtSignal(int, Exception)
+    result_ready = QtCore.pyqtSignal(int, dict)
+    # the next page of the current search, empty if it could not be fetched
+    page_ready = QtCore.pyqtSignal(int, dict)
+    # the current search has no more pages
+    exhausted = QtCore.pyqtSignal(int)
+
+    cache = SearchResultCache()
+    search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS)
+    thumbnail_prefetcher = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+
+    def __init__(self):
+        super().__init__()
+
+        # set by the gui thread when a new search starts
+        self.generation = 0
+
+        self.search_text = ""
+        # anything with the result and next methods of ytsearch.VideosSearch
+        self.videos_search = None
+        self.next_result: Optional[dict] = None
+        self.has_next = True
+
+    def fetch(self, function, generation: int):
+        """
+        runs the blocking network call on the search executor, and gives up
+        waiting for it as soon as its search is superseded
+        """
+        future = SearchVideo.search_executor.submit(
+            self.run_if_current, function, generation
+        )
+        while not wait([future], timeout=SEARCH_POLL_INTERVAL).done:
+            if generation != self.generation:
+                raise InterruptedError("The search was superseded")
+        return future.result()
+
+    def run_if_current(self, function, generation: int):
+        if generation != self.generation:
+            raise InterruptedError("The search was superseded")
+        return function()
+
+    def search(self, search_text: str, generation: int):
+        if generation != self.generation:
+            return
+
+        self.search_text = search_text
+        self.videos_search = None
+        self.next_result = None
+        self.has_next = True
+
+        cached_result, stale = SearchVideo.cache.get(search_text, SEARCH_LIMIT)
+        if cached_result is not None:
+            MetadataService.store_search_result(cached_result)
+            self.result_ready.emit(generation, cached_result)
+            if not stale:
+                # the continuation needs a search of its own, so it's only
+                # fetched once next_page asks for it
+                self.done.emit()
+                return
 
-    def search(self, search_text):
         try:
-            search_results = ytsearch.VideosSearch(
-                search_text, limit=SEARCH_LIMIT, timeout=10
-            ).result()
-            self.result_ready.emit(search_results)
+            self.videos_search = self.fetch(
+                partial(network.provider.search, search_text, SEARCH_LIMIT, timeout=10),
+                generation,
+            )
+            search_results = self.videos_search.result()
+            SearchVideo.cache.put(search_text, SEARCH_LIMIT, search_results)
+            MetadataService.store_search_result(search_results)
+
+            # the stale results are already on screen, only redraw if they changed
+            changed = cached_result is None or self.video_ids(
+                cached_result
+            ) != self.video_ids(search_results)
+            if changed:
+                self.result_ready.emit(generation, search_results)
+        except InterruptedError:
+            logger.debug("Dropped the superseded search %s", search_text)
+            return
         except Exception as error:
             logger.error("Error occurred while searching! (Error: %s)", error)
-            self.error_occurred.emit(error)
+            if cached_result is None:
+                self.error_occurred.emit(generation, error)
+            return
         finally:
             self.done.emit()
 
+        self.prefetch_next_page(generation)
+
+    def next_page(self, generation: int):
+        if generation != self.generation:
+            return
+
+        if self.next_result is None and self.has_next:
+            # the prefetch failed, or the first page came from the cache
+            self.prefetch_next_page(generation)
+
+        if self.next_result is None:
+            if self.has_next:
+                self.page_ready.emit(generation, {"result": []})
+            else:
+                self.exhausted.emit(generation)
+            return
+
+        next_result, self.next_result = self.next_result, None
+        self.page_ready.emit(generation, next_result)
+        self.prefetch_next_page(generation)
+
+    def prefetch_next_page(self, generation: int):
+        """
+        fetches the page after the shown ones, and starts downloading its
+        thumbnails into the disk cache
+        """
+        try:
+            if self.videos_search is None:
+                # the first page came from the cache, so there is no continuation
+                # key yet, it comes with the first page of a new search
+                self.videos_search = self.fetch(
+                    partial(
+                        network.provider.search,
+                        self.search_text,
+                        SEARCH_LIMIT,
+                        timeout=10,
+                    ),
+                    generation,
+                )
+
+            if not self.fetch(self.videos_search.next, generation):
+                self.has_next = False
+                return
+            self.next_result = self.videos_search.result()
+            MetadataService.store_search_result(self.next_result)
+        except InterruptedError:
+            return
+        except Exception as error:
+            logger.error("Failed to fetch the next page! (Error: %s)", error)
+            return
+
+        if not self.next_result["result"]:
+            self.next_result = None
+            self.has_next = False
+            return
+
+        for result in self.next_result["result"]:
+            try:
+                url = result["thumbnails"][0]["url"]
+            except Exception:
+                continue
+            SearchVideo.thumbnail_prefetcher.submit(
+                self.prefetch_thumbnail, url, generation
+            )
+
+    def prefetch_thumbnail(self, url: str, generation: int):
+        if generation != self.generation:
+            return
+
+        try:
+            ImageLoader.disk_cache.prefetch(url)
+        except Exception as error:
+            logger.debug("Failed to prefetch %s (Error: %s)", url, error)
+
+    @staticmethod
+    def video_ids(search_result: dict) -> list[str]:
+        return [result.get("id") for result in search_result["result"]]
+
 
 class ImageLoader(QObject):
+    """
+    lives on the image loading thread for the whole session, every page of
+    results is queued to it with the generation of the results it belongs to
+    """
+
     done = QtCore.pyqtSignal()
-    image_loaded = QtCore.pyqtSignal(int)
+    # generation, row index, thumbnail, duration
+    image_loaded = QtCore.pyqtSignal(int, int, QImage, str)
+
+    disk_cache = ThumbnailDiskCache()
 
     def __init__(self):
         super().__init__()
 
-        self.thumbnails = []
-        self.interrupt = False
+        # bumped by the gui thread whenever the results are replaced,
+        # loads of older generations stop as soon as they notice
+        self.generation = 0
 
-    def load_images(self, search_result: dict, widget_size: QSize):
-        self.thumbnails.clear()
+    def load_thumbnail(self, url: str, width: int, generation: int) -> QImage:
+        """
+        fetches and scales a thumbnail, runs in the thread pool so it returns a
+        QImage, QPixmaps can only be made on the gui thread
+        """
+        if generation != self.generation:
+            raise InterruptedError("Image loading was interrupted")
 
-        for index, result in enumerate(search_result["result"]):
-            if self.interrupt:
-                self.done.emit()
-                return
+        return self.disk_cache.get(url, width)
+
+    def load_images(
+        self, search_result: dict, widget_size: QSize, first_row: int, generation: int
+    ):
+        if generation != self.generation:
+            return
 
+        # bucketed so that the scaled variants on disk survive small resizes
+        reduced_width = ThumbnailCache.bucket(int(widget_size.width() / 4))
+
+        executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS)
+        futures: dict[Future, tuple[int, dict]] = dict()
+        for index, result in enumerate(search_result["result"]):
             try:
                 url = result["thumbnails"][0]["url"]
-                data = urlreq.urlopen(url).read()
+            except Exception:
+                url = ""
+            future = executor.submit(
+                self.load_thumbnail, url, reduced_width, generation
+            )
+            futures[future] = (first_row + index, result)
 
-                image = QPixmap()
-                image.loadFromData(data)
+        pending = set(futures)
+        while pending and generation == self.generation:
+            # polls so that a superseded load stops without waiting for a slow fetch
+            finished, pending = wait(
+                pending, timeout=SEARCH_POLL_INTERVAL, return_when=FIRST_COMPLETED
+            )
+            for future in finished:
+                if generation != self.generation:
+                    break
 
-                height_to_width_ratio = image.height() / image.width()
-                reduced_width = int(widget_size.width() / 4)
-                reduced_height = int(reduced_width * height_to_width_ratio)
+                row, result = futures[future]
+                try:
+                    image = future.result()
+                except Exception as error:
+                    logger.error("Failed to load image! (Error: %s)", error)
+                    image = QImage("images:no-thumbnail.png")
 
-                image = image.scaled(
-                    reduced_width,
-                    reduced_height,
-                    Qt.AspectRatioMode.KeepAspectRatio,
-                    Qt.TransformationMode.SmoothTransformation,
+                self.image_loaded.emit(
+                    generation, row, image, result.get("duration") or ""
                 )
-                self.thumbnails.append((image, result["duration"]))
 
-            except Exception as error:
-                logger.error("Failed to load image! (Error: %s)", error)
-                self.thumbnails.append(QPixmap("images:no-thumbnail.png"))
-                self.image_loaded.emit(index)
+        # requests that are still in flight finish on their own within THUMBNAIL_TIMEOUT,
+        # their results are simply dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+        self.done.emit()
+
+
+class SearchCoordinator(QObject):
+    """
+    owns the search and image loading workers of the search menu
+
+    every search gets a new generation, the workers give up on the work of
+    older generations, and whatever they still emit for them is dropped here,
+    so only the latest search ever reaches the results table
+    """
+
+    # the search actually starts, after the debounce if it was typed
+    search_started = QtCore.pyqtSignal(str)
+    result_ready = QtCore.pyqtSignal(dict)
+    page_ready = QtCore.pyqtSignal(dict)
+    exhausted = QtCore.pyqtSignal()
+    error_occurred = QtCore.pyqtSignal(Exception)
+    # row index, thumbnail, duration
+    image_loaded = QtCore.pyqtSignal(int, QImage, str)
+
+    # queued to the workers
+    search_requested = QtCore.pyqtSignal(str, int)
+    next_page_requested = QtCore.pyqtSignal(int)
+    images_requested = QtCore.pyqtSignal(dict, QSize, int, int)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+
+        self.generation = 0
+        self.pending_text = ""
+
+        self.debounce_timer = QTimer(self)
+        self.debounce_timer.setSingleShot(True)
+        self.debounce_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.debounce_timer.timeout.connect(lambda: self.search(self.pending_text))
+
+        self.search_video = SearchVideo()
+        self.image_loader = ImageLoader()
+        self.search_thread = QThread()
+        self.image_loading_thread = QThread()
+        self.search_video.moveToThread(self.search_thread)
+        self.image_loader.moveToThread(self.image_loading_thread)
+
+        self.search_requested.connect(self.search_video.search)
+        self.next_page_requested.connect(self.search_video.next_page)
+        self.images_requested.connect(self.image_loader.load_images)
+        self.search_video.result_ready.connect(self.receive_result)
+        self.search_video.page_ready.connect(self.receive_page)
+        self.search_video.exhausted.connect(self.receive_exhausted)
+        self.search_video.error_occurred.connect(self.receive_error)
+        self.image_loader.image_loaded.connect(self.receive_image)
+
+        self.search_thread.start()
+        self.image_loading_thread.start()
+
+    def schedule(self, search_text: str):
+        """
+        searches once the text has not changed for SEARCH_DEBOUNCE_MS
+        """
+        self.pending_text = search_text
+        if not search_text.strip():
+            self.debounce_timer.stop()
+            return
+        self.debounce_timer.start()
+
+    def search(self, search_text: str):
+        self.debounce_timer.stop()
+        if not search_text.strip():
+            return
+
+        self.generation += 1
+        self.search_video.generation = self.generation
+        self.image_loader.generation += 1
+
+        self.search_started.emit(search_text)
+        self.search_requested.emit(search_text, self.generation)
+
+    def next_page(self):
+        self.next_page_requested.emit(self.generation)
+
+    def load_images(self, search_result: dict, widget_size: QSize, first_row: int):
+        self.images_requested.emit(
+            search_result, widget_size, first_row, self.image_loader.generation
+        )
+
+    def receive_result(self, generation: int, search_result: dict):
+        if generation != self.generation:
+            return
+
+        # a refreshed result replaces the cached one, its thumbnails are not needed
+        self.image_loader.generation += 1
+        self.result_ready.emit(search_result)
+
+    def receive_page(self, generation: int, search_result: dict):
+        if generation == self.generation:
+            self.page_ready.emit(search_result)
+
+    def receive_exhausted(self, generation: int):
+        if generation == self.generation:
+            self.exhausted.emit()
+
+    def receive_error(self, generation: int, error: Exception):
+        if generation == self.generation:
+            self.error_occurred.emit(error)
+
+    def receive_image(self, generation: int, row: int, image: QImage, duration: str):
+        if generation == self.image_loader.generation:
+            self.image_loaded.emit(row, image, duration)
+
+    def shutdown(self):
+        """
+        cancels whatever is running and waits for both workers to return
+        """
+        self.debounce_timer.stop()
+        self.generation += 1
+        self.search_video.generation = self.generation
+        self.image_loader.generation += 1
+
+        for thread in (self.search_thread, self.image_loading_thread):
+            thread.quit()
+            thread.wait()
+
+
+class LoudnessAnalyzer(QObject):
+    """
+    measures the loudness of the downloaded musics in a pool of processes, one
+    per core, and stores the gain that brings them to LOUDNESS_TARGET
+
+    the files are decoded with ffmpeg, without it nothing is analyzed
+    """
+
+    # video id, gain
+    analyzed = QtCore.pyqtSignal(str, float)
+    # video id, loudness, true peak, None if the measurement failed
+    measured = QtCore.pyqtSignal(str, object, object)
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.in_flight: set[str] = set()
+
+        # the pool calls back on its own thread, the results are stored on this one
+        self.measured.connect(self.store)
+
+    def analyze(self, video_ids: list[str]):
+        if not video_ids:
+            return
+        if shutil.which("ffmpeg") is None:
+            logger.warning("ffmpeg was not found, the loudness is not analyzed")
+            return
+
+        if self.executor is None:
+            # spawned instead of forked, the processes must not inherit Qt
+            self.executor = ProcessPoolExecutor(
+                max_workers=LOUDNESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+
+        for video_id in video_ids:
+            if video_id in self.in_flight:
                 continue
+            self.in_flight.add(video_id)
 
-            self.image_loaded.emit(index)
+            future = self.executor.submit(
+                loudness.analyze, os.path.join(DOWNLOAD_AUDIO_TO, video_id)
+            )
+            future.add_done_callback(partial(self.collect, video_id))
+
+    def collect(self, video_id: str, future: Future):
+        if future.cancelled():
+            return
+
+        try:
+            measured_loudness, true_peak = future.result()
+        except Exception as error:
+            logger.error("Failed to analyze %s (Error: %s)", video_id, error)
+            self.measured.emit(video_id, None, None)
+            return
+
+        self.measured.emit(video_id, measured_loudness, true_peak)
+
+    def store(
+        self,
+        video_id: str,
+        measured_loudness: Optional[float],
+        true_peak: Optional[float],
+    ):
+        self.in_flight.discard(video_id)
+
+        if measured_loudness is None:
+            # stored anyway, so the music isn't analyzed again on every start
+            gain = 1.0
+        else:
+            gain_db = min(
+                LOUDNESS_TARGET - measured_loudness,
+                LOUDNESS_MAX_TRUE_PEAK - true_peak,
+                LOUDNESS_MAX_GAIN,
+            )
+            gain = 10 ** (gain_db / 20)
+
+        Playlist.library.set_loudness(video_id, measured_loudness, true_peak, gain)
+        index = Playlist.id_index.get(video_id)
+        if index is not None:
+            Playlist.musics[index]["gain"] = gain
+
+        logger.debug("%s: %s LUFS, gain %s", video_id, measured_loudness, gain)
+        self.analyzed.emit(video_id, gain)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+MetadataType = dict[str, str | int | None]
 
-        self.done.emit()
+
+class MetadataService(QObject):
+    """
+    length, title, author and thumbnail url of videos, keyed by video id
+
+    the cache is shared by the whole session, it is filled from the search
+    results and the downloads, and only videos missing from it are fetched
+    with pytube, on a background thread
+    """
+
+    # link, metadata
+    metadata_ready = QtCore.pyqtSignal(str, dict)
+    # link, error
+    metadata_failed = QtCore.pyqtSignal(str, Exception)
+
+    cache: dict[str, MetadataType] = dict()
+    mutex = QMutex()
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+
+        self.executor = ThreadPoolExecutor(max_workers=METADATA_WORKERS)
+        # video id -> links waiting for it, so a video is never fetched twice
+        # at once, even when it's asked for through different links
+        self.in_flight: dict[str, list[str]] = dict()
+        self.in_flight_mutex = QMutex()
+
+    @staticmethod
+    def parse_duration(duration: Optional[str]) -> Optional[int]:
+        """
+        "1:02:03" -> 3723, None for live streams
+        """
+        if not duration:
+            return None
+
+        length = 0
+        for part in duration.split(":"):
+            length = length * 60 + int(part)
+        return length
+
+    @classmethod
+    def lookup(cls, video_id: str) -> Optional[MetadataType]:
+        cls.mutex.lock()
+        metadata = cls.cache.get(video_id)
+        cls.mutex.unlock()
+        return metadata
+
+    @classmethod
+    def store(cls, metadata: MetadataType):
+        cls.mutex.lock()
+        cls.cache[metadata["id"]] = metadata
+        cls.mutex.unlock()
+
+    @classmethod
+    def store_search_result(cls, search_result: dict):
+        for result in search_result["result"]:
+            try:
+                cls.store(
+                    {
+                        "id": result["id"],
+                        "title": result["title"],
+                        "author": result["channel"]["name"],
+                        "length": cls.parse_duration(result.get("duration")),
+                        "thumbnail_url": result["thumbnails"][0]["url"],
+                    }
+                )
+            except Exception as error:
+                logger.debug("Skipped the metadata of a result (Error: %s)", error)
+
+    @classmethod
+    def store_video(cls, video: network.Video):
+        cls.store(
+            {
+                "id": video.video_id,
+                "title": video.title,
+                "author": video.author,
+                "length": video.length,
+                "thumbnail_url": video.thumbnail_url,
+            }
+        )
+
+    def request(self, link: str):
+        """
+        emits metadata_ready or metadata_failed for link, right away if the
+        video is cached
+        """
+        try:
+            video_id = pytube.extract.video_id(link)
+        except Exception as error:
+            self.metadata_failed.emit(link, error)
+            return
+
+        metadata = self.lookup(video_id)
+        if metadata is not None:
+            self.metadata_ready.emit(link, metadata)
+            return
+
+        self.in_flight_mutex.lock()
+        links = self.in_flight.setdefault(video_id, list())
+        links.append(link)
+        first = len(links) == 1
+        self.in_flight_mutex.unlock()
+
+        if first:
+            self.executor.submit(self.fetch, link, video_id)
+
+    def fetch(self, link: str, video_id: str):
+        metadata, error = None, None
+        try:
+            self.store_video(network.provider.video(link))
+            metadata = self.lookup(video_id)
+        except Exception as fetch_error:
+            logger.error(
+                "Failed to fetch the metadata of %s (Error: %s)", link, fetch_error
+            )
+            error = fetch_error
+
+        self.in_flight_mutex.lock()
+        links = self.in_flight.pop(video_id, [])
+        self.in_flight_mutex.unlock()
+
+        for waiting_link in links:
+            if error is None:
+                self.metadata_ready.emit(waiting_link, metadata)
+            else:
+                self.metadata_failed.emit(waiting_link, error)
+
+
+class DownloadStatus(enum.Enum):
+    Queued = 0
+    Running = 1
+    Done = 2
+    Failed = 3
+
+
+class DownloadJob:
+    def __init__(
+        self,
+        link: str,
+        status: DownloadStatus = DownloadStatus.Queued,
+        attempts: int = 0,
+        offset: int = 0,
+        stream: Optional[str] = None,
+    ) -> None:
+        self.link = link
+        # the host the stream is downloaded from, known once the stream is
+        # resolved, the watch link says nothing about it
+        self.host: Optional[str] = None
+        # resolved while the job waits for a slot on its host
+        self.video: Optional[network.Video] = None
+        self.status = status
+        self.attempts = attempts
+        # bytes already in the .part file
+        self.offset = offset
+        # "<itag>:<filesize>" of the stream the .part file was downloaded from
+        self.stream = stream
+
+    def to_json(self) -> dict:
+        return {
+            "link": self.link,
+            "status": self.status.name,
+            "attempts": self.attempts,
+            "offset": self.offset,
+            "stream": self.stream,
+        }
+
+    @classmethod
+    def from_json(cls, json_data: dict) -> "DownloadJob":
+        return cls(
+            json_data["link"],
+            DownloadStatus[json_data.get("status", DownloadStatus.Queued.name)],
+            json_data.get("attempts", 0),
+            json_data.get("offset", 0),
+            json_data.get("stream"),
+        )
 
 
 class VideoDownloadManager(QObject):
     done = QtCore.pyqtSignal()
     done_downloading = QtCore.pyqtSignal(str, Exception, bool)
-    download_thread = QThread()
-    downloader = None
+    # link, percent, bytes per second
+    progress_changed = QtCore.pyqtSignal(str, int, float)
+    # the video id of a finished download about to replace its file, and
+    # once it did, the players have to let go of the file in between
+    replacing = QtCore.pyqtSignal(str)
+    replaced = QtCore.pyqtSignal(str)
 
     mutex = QMutex()
 
-    def __init__(self):
+    def __init__(
+        self,
+        workers: int = DOWNLOAD_WORKERS,
+        downloads_per_host: int = DOWNLOADS_PER_HOST,
+    ):
         QObject.__init__(self)
 
-        VideoDownloadManager.downloader = VideoDownload(self)
+        self.workers = workers
+        self.downloads_per_host = downloads_per_host
 
-    def download(self):
-        Self = VideoDownloadManager
+        self.jobs: list[DownloadJob] = list()
+        self.download_threads: list[tuple[QThread, VideoDownload]] = list()
+        self.active_workers = 0
 
-        if Self.download_thread.isRunning():
+        self.last_journal_save = 0.0
+        self.read_journal()
+
+    def read_journal(self):
+        """
+        restore the jobs that were still queued or running when the app was closed
+        """
+        if not os.path.exists(DOWNLOAD_JOURNAL_FILE):
             return
 
-        Self.download_thread = QThread()
-        Self.downloader = VideoDownload(self)
+        try:
+            with open(DOWNLOAD_JOURNAL_FILE, mode="r") as file:
+                json_data: dict = json.loads(file.read())
+            jobs = [DownloadJob.from_json(job) for job in json_data["jobs"]]
+        except Exception as error:
+            logger.error("Failed to read the download journal! (Error: %s)", error)
+            return
 
-        Self.downloader.moveToThread(Self.download_thread)
-        self.done.connect(Self.download_thread.quit)
+        for job in jobs:
+            # whatever was running got interrupted, it is resumed from its .part file
+            job.status = DownloadStatus.Queued
+        self.jobs.extend(jobs)
 
-        self.download_thread.started.connect(Self.downloader.start_download)
-        self.download_thread.start()
+        if jobs:
+            logger.info(f"Restored {len(jobs)} downloads from the journal")
+
+    def save_journal(self):
+        """
+        write the unfinished jobs to the journal, self.mutex has to be locked
+        """
+        json_data = {
+            "jobs": [
+                job.to_json()
+                for job in self.jobs
+                if job.status in (DownloadStatus.Queued, DownloadStatus.Running)
+            ]
+        }
+
+        try:
+            with open(DOWNLOAD_JOURNAL_FILE + ".tmp", mode="w") as file:
+                file.write(json.dumps(json_data, indent=2))
+            os.replace(DOWNLOAD_JOURNAL_FILE + ".tmp", DOWNLOAD_JOURNAL_FILE)
+        except Exception as error:
+            logger.error("Failed to save the download journal! (Error: %s)", error)
+
+        self.last_journal_save = time.monotonic()
+
+    def download(self):
+        """
+        start as many workers as there are queued jobs, up to self.workers
+        """
+        self.download_threads = [
+            (thread, downloader)
+            for thread, downloader in self.download_threads
+            if thread.isRunning()
+        ]
+
+        self.mutex.lock()
+        queued = sum(job.status is DownloadStatus.Queued for job in self.jobs)
+        new_workers = max(0, min(self.workers - self.active_workers, queued))
+        self.active_workers += new_workers
+        self.mutex.unlock()
+
+        for _ in range(new_workers):
+            download_thread = QThread()
+            downloader = VideoDownload(self)
+
+            downloader.moveToThread(download_thread)
+            downloader.finished.connect(download_thread.quit)
+
+            download_thread.started.connect(downloader.start_download)
+            download_thread.start()
+
+            self.download_threads.append((download_thread, downloader))
 
     def add_download(self, link: str):
         self.mutex.lock()
-        VideoDownloadManager.downloader.download_list.append(link)
+        stream = None
+        for job in self.jobs:
+            if job.link != link:
+                continue
+            if job.status in (DownloadStatus.Queued, DownloadStatus.Running):
+                # already on its way, a second job would fetch the same bytes
+                self.mutex.unlock()
+                return
+            # a retry continues the .part file of the failed job
+            stream = job.stream
+
+        self.jobs.append(DownloadJob(link, stream=stream))
+        self.save_journal()
         self.mutex.unlock()
 
+    def next_job(self) -> Optional[DownloadJob]:
+        """
+        take the first queued job whose host isn't already at its download
+        limit, a job whose stream isn't resolved yet has no host to wait for
+
+        returns None when there is nothing left for the worker, the worker is
+        expected to stop then
+        """
+        self.mutex.lock()
+
+        running = self.running_per_host()
+        for job in self.jobs:
+            if job.status is DownloadStatus.Queued and (
+                job.host is None or running.get(job.host, 0) < self.downloads_per_host
+            ):
+                job.status = DownloadStatus.Running
+                job.attempts += 1
+                self.save_journal()
+                self.mutex.unlock()
+                return job
+
+        # retiring in the same lock, so download() never counts a worker that
+        # already gave up on the queue
+        self.active_workers -= 1
+        all_done = self.active_workers == 0
+        self.mutex.unlock()
+
+        if all_done:
+            self.done.emit()
+        return None
+
+    def running_per_host(self) -> dict[str, int]:
+        """
+        self.mutex has to be locked
+        """
+        running: dict[str, int] = dict()
+        for job in self.jobs:
+            if job.status is DownloadStatus.Running and job.host is not None:
+                running[job.host] = running.get(job.host, 0) + 1
+        return running
+
+    def claim_host(self, job: DownloadJob, video: network.Video, host: str) -> bool:
+        """
+        gives the running job its slot on the host its stream comes from, if
+        the host is already at its limit the job goes back to the queue with
+        the video it resolved and False is returned
+        """
+        self.mutex.lock()
+        if self.running_per_host().get(host, 0) < self.downloads_per_host:
+            job.host = host
+            job.video = None
+            self.mutex.unlock()
+            return True
+
+        job.host = host
+        job.video = video
+        job.status = DownloadStatus.Queued
+        # waiting for the host isn't an attempt
+        job.attempts -= 1
+        self.save_journal()
+        self.mutex.unlock()
+        return False
+
+    def finish_job(self, job: DownloadJob, error: Optional[Exception] = None):
+        self.mutex.lock()
+        if error is not None and job.attempts < DOWNLOAD_MAX_ATTEMPTS:
+            logger.info(f"Retrying {job.link} (attempt {job.attempts})")
+            job.status = DownloadStatus.Queued
+            self.save_journal()
+            self.mutex.unlock()
+            return
+
+        job.status = DownloadStatus.Done if error is None else DownloadStatus.Failed
+        self.save_journal()
+        self.mutex.unlock()
+
+        if error is None:
+            self.done_downloading.emit(job.link, Exception(), False)
+        else:
+            self.done_downloading.emit(job.link, error, True)
+
+    def start_stream(self, job: DownloadJob, stream: str, offset: int):
+        """
+        records which stream the .part file of job holds, right away, so a
+        resume after a crash can tell if it's still the same one
+        """
+        self.mutex.lock()
+        job.stream = stream
+        job.offset = offset
+        self.save_journal()
+        self.mutex.unlock()
+
+    def update_offset(self, job: DownloadJob, offset: int):
+        self.mutex.lock()
+        job.offset = offset
+        if time.monotonic() - self.last_journal_save >= DOWNLOAD_JOURNAL_INTERVAL:
+            self.save_journal()
+        self.mutex.unlock()
+
+    def statuses(self) -> dict[str, DownloadStatus]:
+        self.mutex.lock()
+        statuses = {job.link: job.status for job in self.jobs}
+        self.mutex.unlock()
+        return statuses
+
 
 class VideoDownload(QObject):
-    download_list: list[str] = list()
+    finished = QtCore.pyqtSignal()
 
     def __init__(self, manager: VideoDownloadManager) -> None:
         super().__init__()
@@ -135,58 +938,131 @@ class VideoDownload(QObject):
         self.manager = manager
 
     def start_download(self):
-        Self = VideoDownload
-        while Self.download_list:
-            logger.info(f"download list links: {Self.download_list}")
-            self.manager.mutex.lock()
-            link = Self.download_list[0]
-            self.manager.mutex.unlock()
+        while (job := self.manager.next_job()) is not None:
+            link = job.link
             try:
+                video = job.video or network.provider.video(link)
+                stream = video.audio_stream()
+                if not self.manager.claim_host(job, video, urlparse(stream.url).netloc):
+                    logger.info(f"Waiting for a download from the host of {link}")
+                    continue
+
                 logger.info(f"Starting to download {link}")
-                video = pytube.YouTube(link)
-                stream = video.streams.get_audio_only()
-                stream.download(
-                    DOWNLOAD_AUDIO_TO,
-                    skip_existing=False,
-                    filename=video.video_id,
+                MetadataService.store_video(video)
+                self.download_stream(
+                    job, stream, os.path.join(DOWNLOAD_AUDIO_TO, video.video_id)
                 )
                 logger.info("Downloaded Successful!")
 
-                data = urlreq.urlopen(video.thumbnail_url).read()
+                with network.provider.urlopen(
+                    video.thumbnail_url, timeout=THUMBNAIL_TIMEOUT
+                ) as response:
+                    data = response.read()
 
                 with open(THUMBNAIL_FOLDER + video.video_id, mode="wb+") as file:
                     file.write(data)
 
-                Playlist.urls["musics"].append(
-                    {
-                        "id": video.video_id,
-                        "title": video.title,
-                        "author": video.author,
-                        "volume_multiplier": 1.0,
-                    }
-                )
-                Playlist.images.append(data)
+                music = {
+                    "id": video.video_id,
+                    "title": video.title,
+                    "author": video.author,
+                    "volume_multiplier": 1.0,
+                }
+                Playlist.library.add_music(music)
+                Playlist.push_music(music, data)
 
             except Exception as error:
                 logger.error("Error while downloading video: %s", error)
-                self.manager.done_downloading.emit(link, error, True)
-                self.manager.mutex.lock()
-                self.download_list.pop(0)
-                self.manager.mutex.unlock()
+                self.manager.finish_job(job, error)
                 continue
 
-            self.manager.done_downloading.emit(link, Exception(), False)
-            self.manager.mutex.lock()
-            self.download_list.pop(0)
-            self.manager.mutex.unlock()
+            self.manager.finish_job(job)
+
+        self.finished.emit()
+
+    def download_stream(self, job: DownloadJob, stream: network.AudioStream, path: str):
+        """
+        download the stream in ranges into "path.part" and rename it to path once
+        it is complete, a leftover .part file is resumed from where it stopped
+        """
+        part_path = path + ".part"
+        total = stream.filesize
+        stream_id = f"{stream.itag}:{total}"
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        if offset and (offset > total or job.stream != stream_id):
+            # pytube picked another stream since, its bytes don't continue these
+            logger.warning(
+                f"Restarting {job.link}, the .part file is of another stream"
+            )
+            offset = 0
+        if offset:
+            logger.info(f"Resuming {job.link} from {offset}/{total} bytes")
+        self.manager.start_stream(job, stream_id, offset)
 
-        self.manager.done.emit()
+        last_report = time.monotonic()
+        bytes_since_report = 0
+
+        with open(part_path, mode="r+b" if offset else "wb") as file:
+            file.seek(offset)
+            file.truncate()
+
+            while offset < total:
+                end = min(offset + DOWNLOAD_CHUNK_SIZE, total) - 1
+                request = urlreq.Request(
+                    stream.url, headers={"Range": f"bytes={offset}-{end}"}
+                )
+
+                with network.provider.urlopen(
+                    request, timeout=DOWNLOAD_TIMEOUT
+                ) as response:
+                    if response.status != 206 and offset:
+                        # the server ignored the range, so the whole file is coming
+                        logger.warning("Range not supported, starting over")
+                        offset = 0
+                        file.seek(0)
+                        file.truncate()
+
+                    while block := response.read(DOWNLOAD_BLOCK_SIZE):
+                        file.write(block)
+                        offset += len(block)
+                        bytes_since_report += len(block)
+
+                        now = time.monotonic()
+                        if now - last_report >= DOWNLOAD_PROGRESS_INTERVAL:
+                            self.manager.update_offset(job, offset)
+                            self.manager.progress_changed.emit(
+                                job.link,
+                                int(offset / total * 100),
+                                bytes_since_report / (now - last_report),
+                            )
+                            last_report = now
+                            bytes_since_report = 0
+
+                if offset <= end and offset < total:
+                    raise IOError(f"Connection closed at {offset}/{total} bytes")
+
+            file.flush()
+            os.fsync(file.fileno())
+
+        if not os.path.exists(path):
+            os.replace(part_path, path)
+        else:
+            video_id = os.path.basename(path)
+            # blocks until the players released the file, windows doesn't
+            # replace a file that is open
+            self.manager.replacing.emit(video_id)
+            try:
+                os.replace(part_path, path)
+            finally:
+                self.manager.replaced.emit(video_id)
+        self.manager.progress_changed.emit(job.link, 100, 0.0)
 
 
 class PlaylistLoader(QObject):
     done_loading = QtCore.pyqtSignal()
     error_occurred = QtCore.pyqtSignal(Exception)
-    item_loaded = QtCore.pyqtSignal(bytes, str, str)
+    item_loaded = QtCore.pyqtSignal(bytes, str, str, str)
 
     def __init__(
         self, playlist_widget: Playlist, parent: QObject | None = None
@@ -201,29 +1077,17 @@ class PlaylistLoader(QObject):
             os.makedirs(DOWNLOADS_PLAYLIST)
 
         try:
-            with open(PLAYLIST_DIRECTORY + "downloads.json") as file:
-                data: dict[list[dict]] = json.loads(file.read())
+            data = self.playlist_widget.library.musics()
         except Exception as error:
             self.error_occurred.emit(error)
+            self.done_loading.emit()
             return
 
-        musics = list()
-
         try:
-            for music in data["musics"]:
-                video_id = music.get("id", "")
-                title = music.get("title", "")
-                author = music.get("author", "")
-                volume_multiplier = music.get("volume_multiplier", 1.0)
-
-                musics.append(
-                    {
-                        "id": video_id,
-                        "title": title,
-                        "author": author,
-                        "volume_multiplier": volume_multiplier,
-                    }
-                )
+            for music in data:
+                video_id = music["id"]
+                title = music["title"]
+                author = music["author"]
 
                 if os.path.exists(THUMBNAIL_FOLDER + video_id) or os.path.exists(
                     "resources/images/no-thumbnail.png"
@@ -239,13 +1103,12 @@ class PlaylistLoader(QObject):
                 else:
                     image_data = bytes()
 
-                self.playlist_widget.images.append(image_data)
-                self.item_loaded.emit(image_data, title, author)
+                self.playlist_widget.push_music(music, image_data)
+                self.item_loaded.emit(image_data, title, author, video_id)
         except Exception as error:
             logger.error("Something went wrong! %s", error)
             self.error_occurred.emit(error)
 
-        self.playlist_widget.urls["musics"] = musics
         self.done_loading.emit()
 
 
@@ -16,20 +16,16 @@ class Ui_PlaylistWidget(object):
         self.verticalLayout = QtWidgets.QVBoxLayout(PlaylistWidget)
         self.verticalLayout.setContentsMargins(0, 0, 0, 0)
         self.verticalLayout.setObjectName("verticalLayout")
+        self.filter_bar = QtWidgets.QLineEdit(PlaylistWidget)
+        self.filter_bar.setClearButtonEnabled(True)
+        self.filter_bar.setObjectName("filter_bar")
+        self.verticalLayout.addWidget(self.filter_bar)
         self.playlist = Playlist(PlaylistWidget)
-        self.playlist.setStyleSheet("/* QTableWidget::item{ selection-background-color: rgba(255, 255, 255, 0); selection-color: rgb(0, 150, 0);} */\n"
+        self.playlist.setStyleSheet("/* QTableView::item{ selection-background-color: rgba(255, 255, 255, 0); selection-color: rgb(0, 150, 0);} */\n"
 "\n"
-"QTableWidget::item {selection-background-color: grey; }")
+"QTableView::item {selection-background-color: grey; }")
         self.playlist.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
-        self.playlist.setRowCount(0)
-        self.playlist.setColumnCount(3)
         self.playlist.setObjectName("playlist")
-        item = QtWidgets.QTableWidgetItem()
-        self.playlist.setHorizontalHeaderItem(0, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.playlist.setHorizontalHeaderItem(1, item)
-        item = QtWidgets.QTableWidgetItem()
-        self.playlist.setHorizontalHeaderItem(2, item)
         self.verticalLayout.addWidget(self.playlist)
 
         self.retranslateUi(PlaylistWidget)
@@ -38,10 +34,5 @@ class Ui_PlaylistWidget(object):
     def retranslateUi(self, PlaylistWidget):
         _translate = QtCore.QCoreApplication.translate
         PlaylistWidget.setWindowTitle(_translate("PlaylistWidget", "Form"))
-        item = self.playlist.horizontalHeaderItem(0)
-        item.setText(_translate("PlaylistWidget", "Thumbnail"))
-        item = self.playlist.horizontalHeaderItem(1)
-        item.setText(_translate("PlaylistWidget", "Title"))
-        item = self.playlist.horizontalHeaderItem(2)
-        item.setText(_translate("PlaylistWidget", "Author"))
+        self.filter_bar.setPlaceholderText(_translate("PlaylistWidget", "Find in this playlist..."))
 from my_widget import Playlist